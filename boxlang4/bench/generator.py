@@ -0,0 +1,111 @@
+"""Synthetic BoxLang4 programs for the compile-throughput benchmarks.
+
+The programs are valid, deterministic for a given seed and shaped by four
+knobs: how many functions, how deeply `if`/`while` blocks nest, how many
+operands each expression has and how many files the main file includes.
+"""
+import os
+import random
+
+class ProgramShape:
+    def __init__(self, functions: int = 50, depth: int = 3, expression_size: int = 6, includes: int = 2, seed: int = 4):
+        self.functions = functions
+        self.depth = depth
+        self.expression_size = expression_size
+        self.includes = includes
+        self.seed = seed
+
+    def describe(self) -> str:
+        return (f"functions={self.functions} depth={self.depth} "
+                f"expression_size={self.expression_size} includes={self.includes}")
+
+class ProgramGenerator:
+    OPERATORS = ['+', '-', '*', '&', '|', '^']
+    CONDITIONS = ['<', '>', '==', '!=', '<=', '>=']
+
+    def __init__(self, shape: ProgramShape):
+        self.shape = shape
+        self.random = random.Random(shape.seed)
+        self.defined = []
+
+    def _expression(self, names: list) -> str:
+        terms = []
+        for _ in range(self.shape.expression_size):
+            if self.random.random() < 0.4:
+                terms.append(str(self.random.randint(1, 255)))
+            else:
+                terms.append(self.random.choice(names))
+        expression = terms[0]
+        for term in terms[1:]:
+            expression += f" {self.random.choice(self.OPERATORS)} {term}"
+        return expression
+
+    def _condition(self, names: list) -> str:
+        return f"{self.random.choice(names)} {self.random.choice(self.CONDITIONS)} {self.random.randint(0, 100)}"
+
+    def _block(self, names: list, depth: int, indent: str) -> list:
+        lines = [f"{indent}x: {self._expression(names)};"]
+        if self.defined and self.random.random() < 0.5:
+            callee = self.random.choice(self.defined)
+            lines.append(f"{indent}y: y + open {callee}[{self.random.choice(names)}, x];")
+        if depth == 0:
+            return lines
+        if self.random.random() < 0.5:
+            lines.append(f"{indent}if [{self._condition(names)}] (")
+            lines += self._block(names, depth - 1, indent + "    ")
+            lines.append(f"{indent}) else (")
+            lines += self._block(names, depth - 1, indent + "    ")
+            lines.append(f"{indent})")
+        else:
+            # a bounded loop, so generated programs also run
+            counter = f"i{self.loops}"
+            self.loops += 1
+            lines.append(f"{indent}num24 {counter}: 0;")
+            lines.append(f"{indent}while [{counter} < {self.random.randint(2, 8)}] (")
+            lines += self._block(names + [counter], depth - 1, indent + "    ")
+            lines.append(f"{indent}    {counter}: {counter} + 1;")
+            lines.append(f"{indent})")
+        return lines
+
+    def _function(self, name: str) -> list:
+        names = ['a', 'b', 'x', 'y']
+        self.loops = 0
+        lines = [f"box {name}[num24 a, num24 b] -> num24 (",
+                 "    num24 x: a;",
+                 "    num24 y: b;"]
+        lines += self._block(names, self.shape.depth, "    ")
+        lines += ["    ret x + y;", ")", ""]
+        self.defined.append(name)
+        return lines
+
+    def write(self, directory: str) -> str:
+        """Writes the main file and its includes into `directory`; returns the main file's path."""
+        files = max(self.shape.includes, 0) + 1
+        per_file = [self.shape.functions // files + (1 if index < self.shape.functions % files else 0)
+                    for index in range(files)]
+        include_paths = []
+        counter = 0
+        for index in range(files - 1):
+            guard = f"gen_include_{index}"
+            lines = [f"$ifndef {guard}", f"$define {guard} 1", ""]
+            for _ in range(per_file[index + 1]):
+                lines += self._function(f"gen_{counter}")
+                counter += 1
+            lines.append("$endif")
+            path = os.path.join(directory, f"include_{index}.box")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            include_paths.append(path)
+
+        lines = [f'$include "{os.path.abspath(path)}"' for path in include_paths] + [""]
+        for _ in range(per_file[0]):
+            lines += self._function(f"gen_{counter}")
+            counter += 1
+        calls = " + ".join(f"open {name}[{index}, 1]" for index, name in enumerate(self.defined[-4:])) or "0"
+        lines += ["box _start[] -> void (",
+                  f"    num24 result: {calls};",
+                  ")", ""]
+        main_path = os.path.join(directory, "main.box")
+        with open(main_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+        return main_path
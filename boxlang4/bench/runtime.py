@@ -0,0 +1,143 @@
+"""Runtime benchmarks for generated code.
+
+Compiles every program in bench/programs at each optimization level, runs
+the result in the LC24 emulator and reports executed instructions, cycles
+and code size. The output of every level must match -O0.
+
+    python boxlang4/bench/runtime.py                   # all programs, -O0..-O3 and -Os
+    python boxlang4/bench/runtime.py rec loops -O 0 2  # a subset
+    python boxlang4/bench/runtime.py --asm test5.asm   # run existing assembly
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import tempfile
+
+BOXLANG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROGRAMS_DIR = os.path.join(BOXLANG_DIR, "bench", "programs")
+sys.path.insert(0, BOXLANG_DIR)
+
+from src.Emulator import Emulator, EmulatorError
+from src.InstructionSelector import sequence_cost
+
+LEVELS = ["0", "1", "2", "3", "s"]
+# included by the programs rather than benchmarked on its own
+SHARED_SOURCES = ["common"]
+
+def available_programs() -> list:
+    names = [name[:-len(".box")] for name in os.listdir(PROGRAMS_DIR) if name.endswith(".box")]
+    return sorted(name for name in names if name not in SHARED_SOURCES)
+
+def compile_program(name: str, level: str, asm_path: str):
+    """Compiles bench/programs/<name>.box; returns the compiler's error output on failure.
+    The cache is bypassed so every run measures what the current compiler emits."""
+    result = subprocess.run(
+        [sys.executable, os.path.join(BOXLANG_DIR, "main.py"), f"{name}.box", "-O", level, "-o", asm_path,
+         "--no-cache"],
+        cwd=PROGRAMS_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return (result.stderr or result.stdout).strip()
+    return None
+
+def measure(asm: str) -> dict:
+    emulator = Emulator(asm)
+    output = emulator.run()
+    return {
+        "output": output,
+        "instructions": emulator.steps,
+        "cycles": emulator.cycles,
+        "size": sequence_cost(asm.splitlines(), 'size'),
+    }
+
+def run_asm_files(paths: list) -> int:
+    failed = 0
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            asm = f.read()
+        try:
+            result = measure(asm)
+        except EmulatorError as e:
+            print(f"{path}: emulation failed: {e}")
+            failed += 1
+            continue
+        print(f"{path}: {result['instructions']} instructions, {result['cycles']} cycles, "
+              f"{result['size']} bytes, output {result['output']!r}")
+    return failed
+
+def run_benchmarks(programs: list, levels: list) -> tuple:
+    """Returns ({program: {level: result}}, number of failures)."""
+    results = {}
+    failed = 0
+    print(f"{'program':<12} {'level':<6} {'instructions':>12} {'cycles':>10} {'size':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in programs:
+            results[name] = {}
+            reference = None
+            for level in levels:
+                asm_path = os.path.join(tmp, f"{name}-O{level}.asm")
+                error = compile_program(name, level, asm_path)
+                if error is not None:
+                    print(f"{name:<12} -O{level:<4} compilation failed:\n{error}")
+                    failed += 1
+                    continue
+                with open(asm_path, "r", encoding="utf-8") as f:
+                    asm = f.read()
+                try:
+                    result = measure(asm)
+                except EmulatorError as e:
+                    print(f"{name:<12} -O{level:<4} emulation failed: {e}")
+                    failed += 1
+                    continue
+
+                if reference is None:
+                    reference = result["output"]
+                elif result["output"] != reference:
+                    print(f"{name:<12} -O{level:<4} output {result['output']!r} differs from {reference!r}")
+                    failed += 1
+                results[name][level] = result
+                print(f"{name:<12} -O{level:<4} {result['instructions']:>12} {result['cycles']:>10} {result['size']:>8}")
+    return results, failed
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        prog="bench-runtime",
+        description="Runs BoxLang4 benchmark programs in the LC24 emulator"
+    )
+    arg_parser.add_argument(
+        "programs", nargs="*",
+        help="Programs from bench/programs to run (default: all)"
+    )
+    arg_parser.add_argument(
+        "-O", "--levels", nargs="+", default=LEVELS, choices=LEVELS,
+        help="Optimization levels to compare (default: all)"
+    )
+    arg_parser.add_argument(
+        "--asm", nargs="+", metavar="FILE",
+        help="Run existing assembly files instead of compiling the programs"
+    )
+    arg_parser.add_argument(
+        "--json", metavar="FILE",
+        help="Also write the results to FILE as JSON"
+    )
+    args = arg_parser.parse_args()
+
+    if args.asm:
+        sys.exit(1 if run_asm_files(args.asm) else 0)
+
+    programs = args.programs or available_programs()
+    unknown = [name for name in programs if name not in available_programs()]
+    if unknown:
+        print(f"unknown programs: {', '.join(unknown)}", file=sys.stderr)
+        sys.exit(2)
+
+    results, failed = run_benchmarks(programs, args.levels)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Compile-throughput benchmarks.
+
+Generates BoxLang programs of increasing size, runs every compiler phase on
+them in-process and reports the time per phase, tokens/s, AST nodes/s and
+the peak memory each phase allocates. Results can be saved as a JSON
+baseline; later runs are compared against it and exit with status 1 when
+a phase got slower than the threshold allows.
+
+    python boxlang4/bench/throughput.py --save-baseline
+    python boxlang4/bench/throughput.py --threshold 0.25
+    python boxlang4/bench/throughput.py --functions 400 --depth 4 --includes 8
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+
+BOXLANG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(BOXLANG_DIR, "bench")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baselines", "throughput.json")
+sys.path.insert(0, BOXLANG_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from src.ErrorReporter import ErrorReporter
+from src.Preprocessor import Preprocessor
+from src.Lexer import Lexer
+from src.Parser import Parser
+from src.SemanticAnalyzer import SemanticAnalyzer
+from src.Optimizer import Optimizer
+from src.Compiler import Compiler
+from src.LoopUnroller import NodeCounter
+from generator import ProgramShape, ProgramGenerator
+
+PHASES = ["Preprocessor", "Lexer", "Parser", "SemanticAnalyzer", "Optimizer", "Compiler"]
+# the standard sizes a baseline is recorded for
+SIZES = {
+    "small": ProgramShape(functions=10, depth=2, expression_size=4, includes=1),
+    "medium": ProgramShape(functions=60, depth=3, expression_size=6, includes=3),
+    "large": ProgramShape(functions=120, depth=4, expression_size=8, includes=6),
+}
+
+def run_phases(path: str, opt_level: int, trace_memory: bool = False) -> tuple:
+    """Compiles the file once; returns (seconds or peak bytes per phase, counts)."""
+    measurements = {}
+    counts = {}
+
+    @contextlib.contextmanager
+    def phase(name):
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        if trace_memory:
+            measurements[name] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            measurements[name] = elapsed
+
+    error_reporter = ErrorReporter()
+    with open(path, "r", encoding="utf-8") as f:
+        source_code = f.readlines()
+    error_reporter.load_source_file(path, source_code)
+
+    # the optimizer and code generator report what they did on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        with phase("Preprocessor"):
+            prep = Preprocessor(error_reporter)
+            prep_data = prep.process(source_code, path)
+        with phase("Lexer"):
+            tokens = Lexer(prep_data, error_reporter).tokenize()
+        with phase("Parser"):
+            parser = Parser(tokens, error_reporter)
+            parser.set_defines(prep.get_defines())
+            ast_root = parser.parse()
+        if error_reporter.had_error() or ast_root is None:
+            raise RuntimeError(f"generated program '{path}' does not parse")
+        counter = NodeCounter()
+        counter.visit(ast_root)
+        with phase("SemanticAnalyzer"):
+            SemanticAnalyzer(error_reporter).visit(ast_root)
+        with phase("Optimizer"):
+            if opt_level > 0:
+                Optimizer(level=opt_level).optimize(ast_root)
+        with phase("Compiler"):
+            compiler = Compiler(error_reporter, opt_level=opt_level, abi="fast" if opt_level >= 2 else "stack")
+            compiler.visit(ast_root)
+            code = compiler.get_generated_code()
+
+    counts["source_lines"] = len(prep_data.splitlines())
+    counts["tokens"] = len(tokens)
+    counts["nodes"] = counter.count
+    counts["asm_lines"] = len(code.splitlines())
+    return measurements, counts
+
+def benchmark(shape: ProgramShape, opt_level: int, repeat: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = ProgramGenerator(shape).write(tmp)
+        timings = []
+        for _ in range(repeat):
+            seconds, counts = run_phases(path, opt_level)
+            timings.append(seconds)
+        peaks, _ = run_phases(path, opt_level, trace_memory=True)
+
+    # the fastest run is the one least disturbed by the rest of the machine
+    seconds = {name: min(run[name] for run in timings) for name in PHASES}
+    total = sum(seconds.values())
+    return {
+        "shape": shape.describe(),
+        "opt_level": opt_level,
+        "counts": counts,
+        "seconds": seconds,
+        "peak_bytes": peaks,
+        "total_seconds": total,
+        "tokens_per_second": counts["tokens"] / seconds["Lexer"] if seconds["Lexer"] else 0.0,
+        "nodes_per_second": counts["nodes"] / total if total else 0.0,
+    }
+
+def print_result(name: str, result: dict):
+    counts = result["counts"]
+    print(f"{name}: {result['shape']} -O{result['opt_level']}")
+    print(f"  {counts['source_lines']} lines, {counts['tokens']} tokens, {counts['nodes']} nodes, "
+          f"{counts['asm_lines']} asm lines")
+    for phase_name in PHASES:
+        print(f"  {phase_name:<18} {result['seconds'][phase_name] * 1000:>9.2f} ms "
+              f"{result['peak_bytes'][phase_name] / 1024:>10.1f} KiB peak")
+    print(f"  {'total':<18} {result['total_seconds'] * 1000:>9.2f} ms, "
+          f"{result['tokens_per_second']:,.0f} tokens/s lexed, {result['nodes_per_second']:,.0f} nodes/s end to end")
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> list:
+    """(size, phase, baseline seconds, current seconds) for every phase slower than allowed."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None or previous["shape"] != result["shape"] or previous["opt_level"] != result["opt_level"]:
+            continue
+        for phase_name in PHASES + ["total"]:
+            old = previous["total_seconds"] if phase_name == "total" else previous["seconds"][phase_name]
+            new = result["total_seconds"] if phase_name == "total" else result["seconds"][phase_name]
+            # sub-millisecond phases are mostly timer noise
+            if new > old * (1 + threshold) and new - old > 0.001:
+                regressions.append((name, phase_name, old, new))
+    return regressions
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        prog="bench-throughput",
+        description="Measures how fast each BoxLang4 compiler phase processes generated programs"
+    )
+    arg_parser.add_argument(
+        "-O", "--optimization", type=int, default=2, choices=[0, 1, 2, 3],
+        help="Optimization level to compile at (default: 2)"
+    )
+    arg_parser.add_argument(
+        "--repeat", type=int, default=5,
+        help="Runs per program; the fastest one counts (default: 5)"
+    )
+    arg_parser.add_argument(
+        "--sizes", nargs="+", default=list(SIZES), choices=list(SIZES),
+        help="Standard program sizes to run (default: all)"
+    )
+    arg_parser.add_argument("--functions", type=int, help="Run one custom program with this many functions")
+    arg_parser.add_argument("--depth", type=int, default=3, help="Nesting depth of the custom program")
+    arg_parser.add_argument("--expression-size", type=int, default=6, help="Operands per expression of the custom program")
+    arg_parser.add_argument("--includes", type=int, default=2, help="Included files of the custom program")
+    arg_parser.add_argument(
+        "--baseline", default=DEFAULT_BASELINE, metavar="FILE",
+        help="Baseline JSON to compare with or save to (default: bench/baselines/throughput.json)"
+    )
+    arg_parser.add_argument(
+        "--save-baseline", action="store_true",
+        help="Store these results as the new baseline instead of comparing"
+    )
+    arg_parser.add_argument(
+        "--threshold", type=float, default=0.2,
+        help="Allowed slowdown per phase before it counts as a regression (default: 0.2 = 20%%)"
+    )
+    args = arg_parser.parse_args()
+
+    if args.functions is not None:
+        shapes = {"custom": ProgramShape(args.functions, args.depth, args.expression_size, args.includes)}
+    else:
+        shapes = {name: SIZES[name] for name in args.sizes}
+
+    results = {}
+    for name, shape in shapes.items():
+        results[name] = benchmark(shape, args.optimization, args.repeat)
+        print_result(name, results[name])
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to '{args.baseline}'.")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at '{args.baseline}', nothing to compare with.")
+        return
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = find_regressions(results, baseline, args.threshold)
+    for name, phase_name, old, new in regressions:
+        print(f"REGRESSION {name} {phase_name}: {old * 1000:.2f} ms -> {new * 1000:.2f} ms "
+              f"(+{(new / old - 1) * 100:.0f}%)")
+    if regressions:
+        sys.exit(1)
+    print(f"No phase regressed by more than {args.threshold * 100:.0f}% against the baseline.")
+
+if __name__ == "__main__":
+    main()
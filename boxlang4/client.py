@@ -0,0 +1,33 @@
+"""Thin boxc client: forwards its command line to a running `boxc --server`
+and prints what the server reports, falling back to compiling in this
+process when no server is listening.
+
+    python boxlang4/client.py file.box -O 2 -o file.asm
+    python boxlang4/client.py --stop-server
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.CompileServer import request
+
+def main():
+    argv = sys.argv[1:]
+    command = "compile"
+    if argv == ["--stop-server"]:
+        command = "shutdown"
+    response = request(argv, command=command)
+    if response is None:
+        if command == "shutdown":
+            print("no boxc server is running.", file=sys.stderr)
+            sys.exit(1)
+        from main import compile_lc24
+        compile_lc24(argv)
+        return
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    sys.exit(response["exit"])
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,22 @@
 import os
 import sys
+import json
+import time
+import cProfile
 import argparse
 
-from src.AST import ParserError, SemanticError
-
 from src.ASTPritner import ASTPrinter
-from src.ErrorReporter import ErrorReporter
-from src.SemanticAnalyzer import SemanticAnalyzer
-from src.Optimizer import Optimizer
-
-from src.Preprocessor import Preprocessor
-from src.Lexer import Lexer
-from src.Parser import Parser
-from src.Compiler import Compiler
-
-printer = ASTPrinter();
+from src.CompilerDriver import compile_source
+from src.BatchCompiler import compile_batch, output_path
+from src.Watcher import Watcher
+from src.Depfile import depfile_path, write_depfile
+from src.ASTVisitor import ASTVisitor
+from src.CompileServer import serve
+from src.CompileCache import CompileCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE
+from src.Instrumentation import CompileReport, VisitorStats, count_asm
+from src.LoopUnroller import NodeCounter
 
-def compile_lc24(filename: str):
+def compile_lc24(argv: list = None):
     
     arg_parser = argparse.ArgumentParser(
         prog="boxc",
@@ -25,19 +25,132 @@ def compile_lc24(filename: str):
     
     arg_parser.add_argument(
         "filepath",
-        help="Path to the .box source file to compile"
+        nargs="*",
+        help="Path to the .box source file to compile; several files are compiled as a batch"
     )
     arg_parser.add_argument(
         "-o", "--output",
-        default="a.out",
         help="Path to the output assembly file (default: a.out)"
     )
+    arg_parser.add_argument(
+        "--outdir",
+        metavar="DIR",
+        help="Compile every source file to DIR/<name>.asm"
+    )
+    arg_parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        metavar="N",
+        help="Files compiled in parallel in batch mode (default: one per CPU)"
+    )
     arg_parser.add_argument(
         "-O", "--optimization",
+        default="0",
+        choices=["0", "1", "2", "3", "s"],
+        help="Set optimization level (0, 1, 2 or 3), or 's' to optimize for size. Default is 0."
+    )
+    arg_parser.add_argument(
+        "-D", "--define",
+        action="append",
+        metavar="NAME[=VALUE]",
+        help="Define NAME for the preprocessor before the source is read (VALUE defaults to 1)"
+    )
+    arg_parser.add_argument(
+        "--unroll-threshold",
         type=int,
-        default=0,
-        choices=[0, 1, 2, 3],
-        help="Set optimization level (0, 1, 2 or 3). Default is 0."
+        default=128,
+        metavar="N",
+        help="Largest loop body, in AST nodes, that -O3 may produce when unrolling. Default is 128."
+    )
+    arg_parser.add_argument(
+        "--abi",
+        default="auto",
+        choices=["auto", "stack", "fast"],
+        help="Calling convention: 'stack' passes every argument on the stack, 'fast' passes "
+             "the first two in %%ac/%%bs. 'auto' picks 'fast' at -O2 and above. Use 'stack' "
+             "when hand-written asm calls into BoxLang functions."
+    )
+    arg_parser.add_argument(
+        "-MD",
+        dest="write_depfile",
+        action="store_true",
+        help="Also write a Makefile depfile listing every file read, next to the output as <output>.d"
+    )
+    arg_parser.add_argument(
+        "-MF",
+        dest="depfile",
+        metavar="FILE",
+        help="Write the depfile to FILE (implies -MD; single file only)"
+    )
+    arg_parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and rebuild whenever a source file or anything it includes changes"
+    )
+    arg_parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=0.25,
+        metavar="SECONDS",
+        help="How often --watch checks the files for changes. Default is 0.25."
+    )
+    arg_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always compile, without reading or filling the compilation cache"
+    )
+    arg_parser.add_argument(
+        "--cache-dir",
+        default=os.environ.get("BOXC_CACHE_DIR", DEFAULT_CACHE_DIR),
+        metavar="DIR",
+        help="Directory of the compilation cache (default: $BOXC_CACHE_DIR or ~/.cache/boxc)"
+    )
+    arg_parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE // (1024 * 1024),
+        metavar="MB",
+        help="Size the compilation cache is trimmed to, least recently used first. Default is 64."
+    )
+    arg_parser.add_argument(
+        "--time-passes",
+        action="store_true",
+        help="Report wall and CPU time of every compilation phase"
+    )
+    arg_parser.add_argument(
+        "--mem-report",
+        action="store_true",
+        help="Report the peak memory allocated by every compilation phase (uses tracemalloc)"
+    )
+    arg_parser.add_argument(
+        "--report-format",
+        default="table",
+        choices=["table", "json"],
+        help="Format of the --time-passes/--mem-report/--visitor-stats output. Default is table."
+    )
+    arg_parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="Run the compiler under cProfile and write the statistics to FILE (.pstats)"
+    )
+    arg_parser.add_argument(
+        "--visitor-stats",
+        action="store_true",
+        help="Report calls and time of every visit_<Node> method, per pass"
+    )
+    arg_parser.add_argument(
+        "--server",
+        nargs="?",
+        const="",
+        metavar="SOCKET",
+        help="Run as a compile server on a Unix socket (default: $BOXC_SOCKET or a per-user socket "
+             "in the temp directory); client.py forwards boxc command lines to it"
+    )
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        metavar="N",
+        help="Worker processes of the compile server (default: one per CPU)"
     )
     arg_parser.add_argument(
         "--dump-ast",
@@ -45,71 +158,186 @@ def compile_lc24(filename: str):
         help="Print the Abstract Syntax Tree and exit"
     )
     
-    args = arg_parser.parse_args()
+    args = arg_parser.parse_args(argv)
+    
+    if args.server is not None:
+        serve(compile_lc24, args.server or None, args.workers)
+        return
+    if not args.filepath:
+        arg_parser.error("the following arguments are required: filepath")
+    if len(args.filepath) > 1 or args.outdir:
+        if args.output:
+            arg_parser.error("-o cannot be used with several files; use --outdir")
+        if args.dump_ast or args.time_passes or args.mem_report or args.visitor_stats:
+            arg_parser.error("--dump-ast, --time-passes, --mem-report and --visitor-stats take a single file")
+        if args.depfile:
+            arg_parser.error("-MF cannot be used with several files; -MD writes one depfile per output")
+        args.outdir = args.outdir or "."
+    else:
+        args.filepath = args.filepath[0]
+        args.output = args.output or "a.out"
+        if args.write_depfile or args.depfile:
+            args.depfile = args.depfile or depfile_path(args.output)
+    if args.watch and args.dump_ast:
+        arg_parser.error("--watch cannot be used with --dump-ast")
+    
+    visitor_stats = None
+    if args.visitor_stats:
+        visitor_stats = VisitorStats()
+        visitor_stats.install(ASTVisitor)
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    
+    try:
+        if args.watch:
+            run_watch(args)
+        elif args.outdir:
+            run_batch(args)
+        else:
+            run_compilation(args)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"Profile written to '{args.profile}'.", file=sys.stderr)
+        if visitor_stats:
+            visitor_stats.uninstall()
+            if args.report_format == "json":
+                print(json.dumps(visitor_stats.to_dict(), indent=2), file=sys.stderr)
+            else:
+                print(visitor_stats.format_table(), file=sys.stderr)
+
+def write_output(path: str, code: str, cached: bool = False):
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(code)
+        print(f"Compilation successful{' (cached)' if cached else ''}. Output written to '{path}'.")
+    except IOError:
+        print(f"fatal error: could not write to output file '{path}'", file=sys.stderr)
+        sys.exit(1)
+
+# printed when compile_source stops at a stage
+FAILURE_MESSAGES = {
+    "lexer": "\nLexical analysis failed.",
+    "parser": "\nParsing failed.",
+    "semantic": "\nSemantic analysis failed.",
+}
+
+def parse_defines(definitions: list) -> dict:
+    defines = {}
+    for definition in definitions or []:
+        name, _, value = definition.partition("=")
+        defines[name] = value if value else "1"
+    return defines
+
+def compile_options(args) -> dict:
+    # -Os runs the -O2 pipeline with size as the cost metric, plus outlining
+    optimize_size = args.optimization == "s"
+    return {
+        "defines": parse_defines(args.define),
+        "opt_level": 2 if optimize_size else int(args.optimization),
+        "optimize_size": optimize_size,
+        "abi": args.abi,
+        "unroll_threshold": args.unroll_threshold,
+    }
+
+def run_batch(args):
+    cache_settings = None if args.no_cache else (args.cache_dir, args.cache_size * 1024 * 1024)
+    jobs = args.jobs or os.cpu_count() or 1
+    start = time.perf_counter()
+    try:
+        results = compile_batch(args.filepath, args.outdir, jobs, compile_options(args), cache_settings,
+                                depfiles=args.write_depfile)
+    except (ValueError, OSError) as e:
+        print(f"fatal error: {e}", file=sys.stderr)
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
     
-    error_reporter = ErrorReporter()
+    failed = [result for result in results if not result.success]
+    for result in failed:
+        sys.stderr.write(result.error_text)
+    width = max(len(result.source) for result in results)
+    for result in results:
+        if result.success:
+            status = "cached" if result.cached else "ok"
+            print(f"{status:<8} {result.source:<{width}}  -> {result.output} ({result.seconds * 1000:.1f} ms)")
+        else:
+            print(f"{'FAILED':<8} {result.source:<{width}}  ({result.failed_stage})")
+    print(f"{len(results) - len(failed)} of {len(results)} files compiled in {elapsed:.2f} s with {min(jobs, len(results))} jobs.")
+    if failed:
+        sys.exit(1)
+
+def run_watch(args):
+    if args.outdir:
+        os.makedirs(args.outdir, exist_ok=True)
+        units = [(source, output_path(source, args.outdir)) for source in args.filepath]
+        depfiles = {source: depfile_path(output) for source, output in units} if args.write_depfile else {}
+    else:
+        units = [(args.filepath, args.output)]
+        depfiles = {args.filepath: args.depfile} if args.depfile else {}
+    cache_settings = None if args.no_cache else (args.cache_dir, args.cache_size * 1024 * 1024)
+    Watcher(units, compile_options(args), cache_settings, args.watch_interval, depfiles=depfiles).run()
+
+def run_compilation(args):
+    report = CompileReport(timing=args.time_passes, memory=args.mem_report)
     
     try:
         with open(args.filepath, "r", encoding="utf-8") as f:
-            source_code = f.readlines()
-            error_reporter.load_source_file(args.filepath, source_code)
+            source_text = f.read()
     except FileNotFoundError:
         print(f"fatal error: file '{args.filepath}' not found", file=sys.stderr)
         sys.exit(1)
-        
-    prep = Preprocessor(error_reporter)
-    prep_data = prep.process(source_code, args.filepath)
-    defines = prep.get_defines()
     
-    lexer = Lexer(prep_data, error_reporter)
-    tokens = lexer.tokenize()
-    if error_reporter.had_error():
-        print("\nLexical analysis failed.", file=sys.stderr)
-        sys.exit(1)    
+    # reports and profiles describe the passes, so those builds must run them
+    instrumented = report.enabled or args.profile or args.visitor_stats
+    cache = None
+    if not args.no_cache and not args.dump_ast and not instrumented:
+        cache = CompileCache(args.cache_dir, args.cache_size * 1024 * 1024)
     
-    try:
-        parser = Parser(tokens, error_reporter)
-        parser.set_defines(defines)
-        ast_root = parser.parse()
-    except ParserError:
-        print("\nParsing failed.", file=sys.stderr)
+    result = compile_source(
+        source_text, args.filepath,
+        echo=True,
+        report=report,
+        cache=cache,
+        parse_only=args.dump_ast,
+        **compile_options(args)
+    )
+    
+    if result.failed_stage == "optimizer":
+        print(f"Optimization failed: {result.error}", file=sys.stderr)
         sys.exit(1)
-        
-    if error_reporter.had_error() or ast_root is None:
-        print("\nParsing failed.", file=sys.stderr)
+    if not result.success:
+        print(FAILURE_MESSAGES[result.failed_stage], file=sys.stderr)
         sys.exit(1)
         
     if args.dump_ast:
         printer = ASTPrinter()
-        printer.print(ast_root)
+        printer.print(result.ast)
         sys.exit(0)
-
-    try:
-        semantic_analyzer = SemanticAnalyzer(error_reporter)
-        semantic_analyzer.visit(ast_root)
-    except SemanticError:
-        print("\nSemantic analysis failed.", file=sys.stderr)
-        sys.exit(1)
-        
-    if args.optimization > 0:
+    
+    write_output(args.output, result.assembly, cached=result.cached)
+    if result.cached and args.optimization != "0":
+        print("note: no optimization passes ran, the output came from the compilation cache "
+              "(use --no-cache to see their reports)")
+    if args.depfile:
         try:
-            optimizer = Optimizer(level=args.optimization)
-            optimizer.optimize(ast_root) 
-        except Exception as e:
-            print(f"Optimization failed: {e}", file=sys.stderr)
+            write_depfile(args.depfile, args.output, [args.filepath] + result.included_files)
+        except OSError:
+            print(f"fatal error: could not write to depfile '{args.depfile}'", file=sys.stderr)
             sys.exit(1)
-
-    compiler = Compiler(error_reporter)
-    compiler.visit(ast_root)
-    result_code = compiler.get_generated_code()
     
-    try:
-        with open(args.output, "w", encoding="utf-8") as f:
-            f.write(result_code)
-        print(f"Compilation successful. Output written to '{args.output}'.")
-    except IOError:
-        print(f"fatal error: could not write to output file '{args.output}'", file=sys.stderr)
-        sys.exit(1)
+    if report.enabled:
+        report.finish()
+        node_counter = NodeCounter()
+        node_counter.visit(result.ast)
+        instructions, labels = count_asm(result.assembly)
+        report.count("tokens", len(result.tokens))
+        report.count("ast_nodes", node_counter.count)
+        report.count("instructions", instructions)
+        report.count("labels", labels)
+        print(report.format_json() if args.report_format == "json" else report.format_table(), file=sys.stderr)
     
 if __name__ == "__main__":
-    compile_lc24("test2.box");
\ No newline at end of file
+    compile_lc24();
\ No newline at end of file
@@ -0,0 +1,276 @@
+import re
+from src.InstructionSelector import sequence_cost
+
+LABEL_DEFINITION = r'^\s*([.\w]+):'
+FUNCTION_HEADER = '; Function '
+
+def strip_comment(line: str) -> str:
+    return line.split(';', 1)[0].strip()
+
+class AsmFunction:
+    def __init__(self, name: str, lines: list):
+        self.name = name
+        self.lines = lines
+        self.aliases = []
+
+    @property
+    def symbol(self) -> str:
+        return f"func_{self.name}"
+
+    def labels(self) -> list:
+        found = []
+        for line in self.lines:
+            match = re.match(LABEL_DEFINITION, line)
+            if match:
+                found.append(match.group(1))
+        return found
+
+class AsmProgram:
+    """Generated assembly split into the preamble, one chunk per function
+    (starting at its `; Function` comment) and the data sections."""
+    def __init__(self, code: str):
+        self.preamble = []
+        self.functions = []
+        self.tail = []
+        for line in code.split('\n'):
+            if self.tail or line.startswith(';section'):
+                if not self.tail and self.functions and self.functions[-1].lines[-1] == '':
+                    # keep the blank line that separates code from data with the data
+                    self.functions[-1].lines.pop()
+                    self.tail.append('')
+                self.tail.append(line)
+            elif line.startswith(FUNCTION_HEADER):
+                self.functions.append(AsmFunction(line[len(FUNCTION_HEADER):].strip(), [line]))
+            elif self.functions:
+                self.functions[-1].lines.append(line)
+            else:
+                self.preamble.append(line)
+
+    def render(self) -> str:
+        lines = list(self.preamble)
+        for function in self.functions:
+            for line in function.lines:
+                if line.startswith(f"{function.symbol}:"):
+                    for alias in function.aliases:
+                        lines.append(f"; {alias} is folded into {function.name}")
+                        lines.append(f"func_{alias}:")
+                lines.append(line)
+        lines.extend(self.tail)
+        return "\n".join(lines)
+
+def _signature(function: AsmFunction, canonical: dict) -> tuple:
+    """The function's instructions with its own labels numbered in order of
+    definition, so bodies that differ only in naming compare equal."""
+    local = {label: f"@{index}" for index, label in enumerate(function.labels())}
+    signature = []
+    for line in function.lines:
+        text = strip_comment(line)
+        if not text:
+            continue
+        tokens = []
+        for token in text.split():
+            name, colon = (token[:-1], ':') if token.endswith(':') else (token, '')
+            tokens.append(local.get(name, canonical.get(name, name)) + colon)
+        signature.append(" ".join(tokens))
+    return tuple(signature)
+
+def fold_identical_functions(program: AsmProgram) -> list:
+    """Identical code folding: keeps the first of each group of functions with
+    equal signatures and turns the others into alias labels in front of it.
+    Repeats until stable, since folding callees can make callers identical.
+    Returns (folded name, kept name, bytes saved) for each folded function."""
+    folded = []
+    canonical = {}
+    changed = True
+    while changed:
+        changed = False
+        seen = {}
+        for function in list(program.functions):
+            signature = _signature(function, canonical)
+            if signature not in seen:
+                seen[signature] = function
+                continue
+            kept = seen[signature]
+            kept.aliases.extend([function.name] + function.aliases)
+            program.functions.remove(function)
+            canonical[function.symbol] = kept.symbol
+            for alias in function.aliases:
+                canonical[f"func_{alias}"] = kept.symbol
+            folded.append((function.name, kept.name, sequence_cost(function.lines, 'size')))
+            changed = True
+    return folded
+
+CONDITIONAL_JUMPS = {'je': 'jne', 'jne': 'je', 'jl': None, 'jg': None}
+
+def _jump(text: str):
+    """(mnemonic, target) for a jump instruction, else None."""
+    parts = text.split()
+    if len(parts) == 2 and (parts[0] == 'jmp' or parts[0] in CONDITIONAL_JUMPS):
+        return parts[0], parts[1]
+    return None
+
+def _simplify_function(function: AsmFunction) -> int:
+    """One round of branch cleanups over a function; returns the number of changes."""
+    lines = function.lines
+    texts = [_canonical(line) for line in lines]
+    label_at = {}
+    for index, text in enumerate(texts):
+        if text.endswith(':'):
+            label_at[text[:-1]] = index
+
+    def first_instruction(index):
+        """Index of the first instruction at or after `index`, skipping labels."""
+        while index < len(texts) and (not texts[index] or texts[index].endswith(':')):
+            index += 1
+        return index
+
+    def final_target(label):
+        seen = set()
+        while label in label_at and label not in seen:
+            seen.add(label)
+            index = first_instruction(label_at[label])
+            jump = _jump(texts[index]) if index < len(texts) else None
+            if not jump or jump[0] != 'jmp':
+                break
+            label = jump[1]
+        return label
+
+    def falls_into(index, label):
+        """True if control falling off `index` reaches `label` without executing anything."""
+        index += 1
+        while index < len(texts) and (not texts[index] or texts[index].endswith(':')):
+            if texts[index] == f"{label}:":
+                return True
+            index += 1
+        return False
+
+    changes = 0
+    removed = set()
+    for index, text in enumerate(texts):
+        jump = _jump(text)
+        if not jump:
+            continue
+        mnemonic, target = jump
+        # jump threading: a jump to an unconditional jump goes to its target
+        threaded = final_target(target)
+        if threaded != target:
+            lines[index] = lines[index].replace(target, threaded, 1)
+            texts[index] = f"{mnemonic} {threaded}"
+            target = threaded
+            changes += 1
+        if falls_into(index, target):
+            removed.add(index)
+            changes += 1
+            continue
+        if mnemonic == 'jmp':
+            # an unconditional jump right after another one never runs
+            previous = index - 1
+            while previous >= 0 and not texts[previous]:
+                previous -= 1
+            if previous >= 0 and previous not in removed and (texts[previous] == 'ret' or
+                                                               (_jump(texts[previous]) or ('',))[0] == 'jmp'):
+                removed.add(index)
+                changes += 1
+            continue
+        # `jcc A; jmp B; A:` becomes `jncc B; A:`
+        inverse = CONDITIONAL_JUMPS[mnemonic]
+        following = first_instruction(index + 1)
+        if inverse and following < len(texts) and not any(texts[i].endswith(':') for i in range(index + 1, following)):
+            next_jump = _jump(texts[following])
+            if next_jump and next_jump[0] == 'jmp' and falls_into(following, target):
+                indent = lines[index][:len(lines[index]) - len(lines[index].lstrip())]
+                lines[index] = f"{indent}{inverse} {next_jump[1]}"
+                texts[index] = f"{inverse} {next_jump[1]}"
+                removed.add(following)
+                changes += 1
+    function.lines = [line for index, line in enumerate(lines) if index not in removed]
+    return changes
+
+def simplify_branches(program: AsmProgram) -> list:
+    """Threads jump chains, drops jumps to the next instruction and unreachable
+    jumps, and turns conditional branches around an unconditional jump into
+    a single inverted branch. Returns (function, changes) per changed function."""
+    simplified = []
+    for function in program.functions:
+        total = 0
+        while True:
+            changes = _simplify_function(function)
+            if not changes:
+                break
+            total += changes
+        if total:
+            simplified.append((function.name, total))
+    return simplified
+
+# instructions that cannot move into a subroutine: control flow, anything that
+# touches the stack (the return address sits on top inside the subroutine) and
+# compares, whose flags the following branch reads
+NOT_OUTLINABLE = {'jmp', 'je', 'jne', 'jl', 'jg', 'jsr', 'ret', 'psh', 'pop', 'int', 'cmp'}
+
+def _outlinable(text: str) -> bool:
+    if not text or text.endswith(':'):
+        return False
+    parts = text.split()
+    # local labels resolve against the enclosing function
+    return (parts[0] not in NOT_OUTLINABLE and '%sp' not in parts[1:]
+            and not any(part.startswith('.') for part in parts[1:]))
+
+def _canonical(line: str) -> str:
+    return " ".join(strip_comment(line).split())
+
+def _occurrences(functions: list, sequence: tuple) -> list:
+    """Non-overlapping (function, start line) positions of `sequence`."""
+    found = []
+    length = len(sequence)
+    for function in functions:
+        texts = [_canonical(line) for line in function.lines]
+        index = 0
+        while index + length <= len(texts):
+            if tuple(texts[index:index + length]) == sequence:
+                found.append((function, index))
+                index += length
+            else:
+                index += 1
+    return found
+
+def outline_sequences(program: AsmProgram, min_length: int = 2, max_length: int = 8) -> list:
+    """Machine outlining for -Os: repeatedly finds the instruction sequence whose
+    replacement by `jsr` to a shared subroutine saves the most bytes, and
+    outlines it. Returns (label, instructions, uses, bytes saved) per subroutine."""
+    call_size = sequence_cost(['jsr __outline_0'], 'size')
+    return_size = sequence_cost(['ret'], 'size')
+    outlined = []
+    while True:
+        counts = {}
+        for function in program.functions:
+            texts = [_canonical(line) for line in function.lines]
+            for start in range(len(texts)):
+                for length in range(min_length, max_length + 1):
+                    window = tuple(texts[start:start + length])
+                    if len(window) < length or not _outlinable(window[-1]):
+                        break
+                    if all(_outlinable(text) for text in window):
+                        counts[window] = counts.get(window, 0) + 1
+
+        best, best_saving = None, 0
+        for sequence, count in counts.items():
+            if count < 2:
+                continue
+            size = sequence_cost(list(sequence), 'size')
+            # upper bound first; overlapping windows are resolved below
+            if count * size - (count * call_size + size + return_size) <= best_saving:
+                continue
+            uses = len(_occurrences(program.functions, sequence))
+            saving = uses * size - (uses * call_size + size + return_size)
+            if saving > best_saving:
+                best, best_saving = sequence, saving
+        if best is None:
+            return outlined
+
+        label = f"__outline_{len(outlined)}"
+        occurrences = _occurrences(program.functions, best)
+        for function, start in reversed(occurrences):
+            function.lines[start:start + len(best)] = [f"     jsr {label}"]
+        body = [f"; Outlined sequence {len(outlined)}", f"{label}:"] + [f"     {text}" for text in best] + ["     ret"]
+        program.functions.append(AsmFunction(label, body))
+        outlined.append((label, best, len(occurrences), best_saving))
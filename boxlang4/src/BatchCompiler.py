@@ -0,0 +1,127 @@
+import os
+import time
+import multiprocessing
+import concurrent.futures
+from src.CompilerDriver import compile_source
+from src.CompileCache import CompileCache
+from src.Preprocessor import resolve_include_file
+from src.Depfile import depfile_path, write_depfile
+
+class CachingIncludeResolver:
+    """Reads each include once and hands the same lines to every unit that
+    includes it, rereading only when the file's modification time changes."""
+    def __init__(self):
+        self.files = {}
+
+    def __call__(self, path: str, is_library: bool):
+        key = (path, is_library)
+        entry = self.files.get(key)
+        if entry is not None:
+            filename, lines, mtime = entry
+            try:
+                if os.stat(filename).st_mtime == mtime:
+                    return filename, lines
+            except OSError:
+                pass
+        resolved = resolve_include_file(path, is_library)
+        if resolved is None:
+            self.files.pop(key, None)
+            return None
+        filename, lines = resolved
+        self.files[key] = (filename, lines, os.stat(filename).st_mtime)
+        return resolved
+
+class UnitResult:
+    def __init__(self, source: str, output: str):
+        self.source = source
+        self.output = output
+        self.success = False
+        self.cached = False
+        self.failed_stage = None
+        self.error_text = ""
+        self.seconds = 0.0
+        # every file the build read, the source first
+        self.dependencies = [source]
+
+# one resolver per worker process, shared by the units it compiles
+_worker_resolver = None
+
+def _start_worker():
+    global _worker_resolver
+    _worker_resolver = CachingIncludeResolver()
+
+def compile_unit(source: str, output: str, options: dict, cache_settings, includes_resolver=None,
+                 depfile: str = None) -> UnitResult:
+    """Compiles one file to `output`; never raises for a failed build.
+    Includes go through `includes_resolver`, by default the worker's. A
+    successful build also writes the files it read to `depfile`, if given."""
+    result = UnitResult(source, output)
+    start = time.perf_counter()
+    try:
+        with open(source, "r", encoding="utf-8") as f:
+            text = f.read()
+    except OSError as e:
+        result.failed_stage = "read"
+        result.error_text = f"fatal error: could not read '{source}': {e.strerror}\n"
+        return result
+
+    cache = CompileCache(*cache_settings) if cache_settings else None
+    compiled = compile_source(text, source, includes_resolver or _worker_resolver or CachingIncludeResolver(),
+                              cache=cache, **options)
+    result.dependencies += compiled.included_files
+    if not compiled.success:
+        result.failed_stage = compiled.failed_stage
+        result.error_text = "".join(diagnostic.text for diagnostic in compiled.diagnostics)
+        if compiled.error:
+            result.error_text += f"Optimization failed: {compiled.error}\n"
+    else:
+        try:
+            with open(output, "w", encoding="utf-8") as f:
+                f.write(compiled.assembly)
+            if depfile:
+                write_depfile(depfile, output, result.dependencies)
+            result.success = True
+            result.cached = compiled.cached
+        except OSError as e:
+            result.failed_stage = "write"
+            result.error_text = f"fatal error: could not write '{e.filename or output}': {e.strerror}\n"
+    result.seconds = time.perf_counter() - start
+    return result
+
+def output_path(source: str, outdir: str) -> str:
+    return os.path.join(outdir, os.path.splitext(os.path.basename(source))[0] + ".asm")
+
+def compile_batch(sources: list, outdir: str, jobs: int, options: dict, cache_settings=None, on_result=None,
+                  depfiles: bool = False) -> list:
+    """Compiles every source into `outdir` on `jobs` worker processes and
+    returns their UnitResults in the order given. `options` are keyword
+    arguments for compile_source; `cache_settings` is (directory, max bytes)
+    or None. `on_result` is called with each result as it completes. With
+    `depfiles`, every output gets a .d file next to it."""
+    os.makedirs(outdir, exist_ok=True)
+    outputs = [output_path(source, outdir) for source in sources]
+    clashing = {path for path in outputs if outputs.count(path) > 1}
+    if clashing:
+        raise ValueError(f"several sources would be written to {', '.join(sorted(clashing))}")
+
+    results = {}
+    if jobs <= 1 or len(sources) == 1:
+        _start_worker()
+        for source, output in zip(sources, outputs):
+            results[source] = compile_unit(source, output, options, cache_settings,
+                                           depfile=depfile_path(output) if depfiles else None)
+            if on_result:
+                on_result(results[source])
+    else:
+        context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=context,
+                                                    initializer=_start_worker) as pool:
+            futures = {pool.submit(compile_unit, source, output, options, cache_settings, None,
+                                   depfile_path(output) if depfiles else None): source
+                       for source, output in zip(sources, outputs)}
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                results[futures[future]] = result
+                if on_result:
+                    on_result(result)
+    return [results[source] for source in sources]
@@ -0,0 +1,101 @@
+import os
+import glob
+import functools
+import hashlib
+from src.utils import COMPILER_VERSION
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "boxc")
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+@functools.lru_cache(maxsize=None)
+def compiler_fingerprint() -> str:
+    """COMPILER_VERSION plus a digest of the compiler's own sources, so a
+    modified checkout never reuses output of the code it replaced."""
+    digest = hashlib.sha256(COMPILER_VERSION.encode())
+    sources = sorted(glob.glob(os.path.join(SOURCE_DIR, "*.py"))) + [os.path.join(os.path.dirname(SOURCE_DIR), "main.py")]
+    for path in sources:
+        with open(path, "rb") as f:
+            digest.update(os.path.basename(path).encode() + b"\0" + f.read())
+    return f"{COMPILER_VERSION}-{digest.hexdigest()[:16]}"
+
+class CompileCache:
+    """Content-addressed store of generated assembly, one file per key.
+    Reading an entry refreshes its modification time, and storing one
+    evicts the least recently used entries until the directory fits in
+    `max_bytes`. Each entry starts with a digest of the code after it, so a
+    damaged or truncated entry reads as a miss."""
+    SUFFIX = ".asm"
+    HEADER = "; boxc-cache "
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, source_text: str, included_sources: list, defines: dict, options: dict) -> str:
+        """Hashes everything the output depends on: the compiler, the options,
+        the defines, the main source and every (filename, text) it included."""
+        digest = hashlib.sha256()
+        digest.update(f"compiler={compiler_fingerprint()}\n".encode())
+        for name in sorted(options):
+            digest.update(f"option {name}={options[name]}\n".encode())
+        for name in sorted(defines):
+            digest.update(f"define {name}={defines[name]}\n".encode())
+        digest.update(f"source {hashlib.sha256(source_text.encode()).hexdigest()}\n".encode())
+        for filename, text in included_sources:
+            digest.update(f"include {filename} {hashlib.sha256(text.encode()).hexdigest()}\n".encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                header = f.readline()
+                code = f.read()
+            if header != f"{self.HEADER}{self._digest(code)}\n":
+                os.remove(path)
+                return None
+            os.utime(path)
+        except (OSError, UnicodeDecodeError):
+            return None
+        return code
+
+    def _digest(self, code: str) -> str:
+        return hashlib.sha256(code.encode()).hexdigest()
+
+    def put(self, key: str, code: str):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # write aside and rename, so concurrent builds never read half an entry
+            temp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8", newline="") as f:
+                f.write(f"{self.HEADER}{self._digest(code)}\n")
+                f.write(code)
+            os.replace(temp_path, self._path(key))
+            self._evict()
+        except OSError:
+            # the cache is an optimization; failing to fill it is not an error
+            pass
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
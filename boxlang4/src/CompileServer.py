@@ -0,0 +1,156 @@
+import io
+import os
+import sys
+import json
+import socket
+import tempfile
+import threading
+import contextlib
+import socketserver
+import multiprocessing
+import concurrent.futures
+
+# this module is also imported by the thin client, so it only uses the
+# standard library at import time
+
+def default_socket_path() -> str:
+    return os.environ.get("BOXC_SOCKET") or os.path.join(tempfile.gettempdir(), f"boxc-{os.getuid()}.sock")
+
+def _send(connection, message: dict):
+    connection.sendall(json.dumps(message).encode() + b"\n")
+
+def _receive(stream):
+    line = stream.readline()
+    return json.loads(line) if line else None
+
+# --- server ------------------------------------------------------------------------
+
+_compile_function = None
+
+def _warm_up(compile_function):
+    """Runs once in every worker, which already has the compiler imported:
+    keeps the compile entry point and hashes the compiler sources for the
+    cache key once instead of on every request."""
+    global _compile_function
+    _compile_function = compile_function
+    from src.CompileCache import compiler_fingerprint
+    compiler_fingerprint()
+
+def _compile_request(argv: list, cwd: str, env: dict) -> dict:
+    """Runs one client command line in this worker and returns its outcome."""
+    stdout, stderr = io.StringIO(), io.StringIO()
+    exit_code = 0
+    saved_env = {name: os.environ.get(name) for name in env}
+    try:
+        os.chdir(cwd)
+        os.environ.update(env)
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            _compile_function(argv)
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except Exception as e:
+        stderr.write(f"internal compiler error: {e}\n")
+        exit_code = 1
+    finally:
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "exit": exit_code}
+
+# variables of the client's environment that change what boxc does
+FORWARDED_ENV = ["BOXC_CACHE_DIR"]
+
+# options that would start another server or never return inside a worker
+REJECTED_OPTIONS = ["--server", "--watch"]
+
+def _rejected_option(argv: list):
+    """Returns the first REJECTED_OPTIONS entry argv asks for, also when it is
+    spelled `--opt=value` or abbreviated, as argparse accepts both."""
+    for arg in argv:
+        if arg == "--":
+            break
+        name = arg.split("=", 1)[0]
+        if not name.startswith("--") or len(name) < 3:
+            continue
+        for option in REJECTED_OPTIONS:
+            if option.startswith(name) or name.startswith(option):
+                return option
+    return None
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = _receive(self.rfile)
+        if request is None:
+            return
+        if request.get("command") == "shutdown":
+            _send(self.connection, {"stdout": "", "stderr": "boxc server stopped.\n", "exit": 0})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return
+        rejected = _rejected_option(request["argv"])
+        if rejected:
+            _send(self.connection, {"stdout": "", "stderr": f"fatal error: {rejected} cannot be sent to a server\n", "exit": 1})
+            return
+        future = self.server.pool.submit(_compile_request, request["argv"], request["cwd"], request.get("env", {}))
+        try:
+            response = future.result()
+        except Exception as e:
+            response = {"stdout": "", "stderr": f"internal compiler error: {e}\n", "exit": 1}
+        _send(self.connection, response)
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(compile_function, socket_path: str = None, workers: int = None):
+    """Runs the compile server until it is asked to stop. `compile_function`
+    takes the argument list of one boxc invocation."""
+    socket_path = socket_path or default_socket_path()
+    if os.path.exists(socket_path):
+        if _is_listening(socket_path):
+            print(f"fatal error: a boxc server is already listening on '{socket_path}'", file=sys.stderr)
+            sys.exit(1)
+        os.remove(socket_path)
+
+    workers = workers or os.cpu_count() or 1
+    # fork keeps the imported compiler in the workers
+    context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+    pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                                  initializer=_warm_up, initargs=(compile_function,))
+    server = _Server(socket_path, _RequestHandler)
+    server.pool = pool
+    print(f"boxc server listening on '{socket_path}' with {workers} workers.", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.shutdown(cancel_futures=True)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+def _is_listening(socket_path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+# --- client ------------------------------------------------------------------------
+
+def request(argv: list, socket_path: str = None, command: str = "compile"):
+    """Sends one command line to the server; returns its response, or None
+    when no server is listening."""
+    socket_path = socket_path or default_socket_path()
+    message = {"command": command, "argv": argv, "cwd": os.getcwd(),
+               "env": {name: os.environ[name] for name in FORWARDED_ENV if name in os.environ}}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(socket_path)
+        except OSError:
+            return None
+        _send(connection, message)
+        with connection.makefile("rb") as stream:
+            return _receive(stream)
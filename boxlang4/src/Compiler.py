@@ -3,7 +3,12 @@ from src.ASTVisitor import ASTVisitor
 from src.ErrorReporter import ErrorReporter
 from src.AST import *
 from src.Token import TokenType
-from src.utils import get_size_of_type, to_twos_complement_24bit
+from src.utils import get_size_of_type, to_twos_complement_24bit, evaluate_constant, string_constant
+from src.RegisterAllocator import RegisterAllocator, EscapeAnalyzer
+from src.Optimizer import UsageAnalyzer
+from src.InstructionSelector import InstructionSelector, ALU_MNEMONICS
+from src.StringPool import StringPool
+from src.AsmOptimizer import AsmProgram, fold_identical_functions, simplify_branches, outline_sequences
 
 class VariableCollector(ASTVisitor):
     def __init__(self):
@@ -23,22 +28,200 @@ class VariableCollector(ASTVisitor):
                 if field_value:
                     for stmt in field_value:
                         self.visit(stmt)
+                        
+    def collect(self, body: list):
+        for stmt in body:
+            self.visit(stmt)
+            
+    def reserve(self, size: int):
+        self.current_offset += size
+
+class StackSlotAllocator:
+    """Packs locals into the frame so that variables with disjoint lifetimes
+    share bytes. A local lives from its declaration to the statement of its
+    block that uses it last; escaped locals live until the block closes.
+    Every declaration gets its own slot in `slots`, keyed by node id."""
+    def __init__(self, escaped: set, skip: set = None):
+        self.escaped = escaped
+        self.skip = skip or set()
+        self.local_vars = {}
+        self.slots = {}
+        self.occupied = []
+        self.current_offset = 0
+
+    def collect(self, body: list):
+        self._allocate_block(body)
+
+    def reserve(self, size: int):
+        if size > 0:
+            self._allocate(size)
+
+    def _allocate(self, size: int) -> int:
+        start = 0
+        for used_start, used_size in sorted(self.occupied):
+            if start + size <= used_start:
+                break
+            start = max(start, used_start + used_size)
+        self.occupied.append((start, size))
+        self.current_offset = max(self.current_offset, start + size)
+        return start
+
+    def _allocate_block(self, stmts: list):
+        last_use = {}
+        for index, stmt in enumerate(stmts):
+            analyzer = UsageAnalyzer()
+            analyzer.visit(stmt)
+            for var_name in analyzer.usages:
+                last_use[var_name] = index
+
+        live = {}
+        for index, stmt in enumerate(stmts):
+            if isinstance(stmt, VarDeclarationNode) and stmt.var_name not in self.skip:
+                size = get_size_of_type(stmt.var_type)
+                start = self._allocate(size)
+                live[stmt.var_name] = (start, size)
+                slot = {'type': stmt.var_type, 'offset': -(start + size)}
+                self.slots[id(stmt)] = slot
+                self.local_vars.setdefault(stmt.var_name, slot)
+            elif isinstance(stmt, VarDeclarationNode):
+                self.local_vars.setdefault(stmt.var_name, {'type': stmt.var_type})
+
+            for block in self._nested_blocks(stmt):
+                self._allocate_block(block)
+
+            for var_name in list(live):
+                if var_name not in self.escaped and last_use.get(var_name, -1) <= index:
+                    self.occupied.remove(live.pop(var_name))
+
+        for interval in live.values():
+            self.occupied.remove(interval)
+
+    def _nested_blocks(self, stmt) -> list:
+        if isinstance(stmt, IfNode):
+            return [block for block in (stmt.then_branch, stmt.else_branch) if block]
+        if isinstance(stmt, WhileNode):
+            return [stmt.body]
+        if isinstance(stmt, SwitchNode):
+            blocks = [case_node.body for case_node in stmt.cases]
+            return blocks + ([stmt.default_case] if stmt.default_case else [])
+        return []
+
+# jumps taken when `cmp %ac x` found the comparison true / false; two jumps
+# need the compare repeated between them
+BRANCHES_IF_TRUE = {
+    TokenType.EQUAL_EQUAL: ["je"],
+    TokenType.NOT_EQUAL: ["jne"],
+    TokenType.LESS_THAN: ["jl"],
+    TokenType.GREATHER_THAN: ["jg"],
+    TokenType.LESS_EQUAL: ["jl", "je"],
+    TokenType.GREATHER_EQUAL: ["jg", "je"],
+}
+BRANCHES_IF_FALSE = {
+    TokenType.EQUAL_EQUAL: ["jne"],
+    TokenType.NOT_EQUAL: ["je"],
+    TokenType.LESS_THAN: ["jg", "je"],
+    TokenType.GREATHER_THAN: ["jl", "je"],
+    TokenType.LESS_EQUAL: ["jg"],
+    TokenType.GREATHER_EQUAL: ["jl"],
+}
 
 class Compiler(ASTVisitor):
-    def __init__(self, error_reporter: ErrorReporter):
+    # registers carrying the first arguments under the fast calling convention
+    FAST_ARG_REGISTERS = ['%ac', '%bs']
+    
+    def __init__(self, error_reporter: ErrorReporter, opt_level: int = 0, abi: str = 'stack', optimize_size: bool = False, log=print):
         self.code = ""
+        # receives one line per optimization report
+        self.log = log
+        self.opt_level = opt_level
+        self.optimize_size = optimize_size
+        # the mode the reports are tagged with: -Os runs the -O2 pipeline
+        self.level_name = "Os" if optimize_size else f"O{opt_level}"
+        self.arg_registers = self.FAST_ARG_REGISTERS if abi == 'fast' else []
+        self.merge_call_cleanup = opt_level >= 2
+        self.pending_call_cleanup = 0
+        self.statement_call = None
+        self.frame_elided = False
+        self.tail_calls = False
         self.namespace_stack = []
         self.data_section = []
+        self.initialized_data = []
+        self.bss_section = []
         self.str_counter = 0
+        self.string_pool = StringPool() if opt_level >= 1 else None
         self.local_vars = {}
         self.in_function = False
         self.registers = ['%ac', '%bs', '%cn', '%dc', '%dt', '%di']
         self.used_registers = set()
         self.current_func_name = None
         self.label_counter = 0
+        self.saved_registers = []
+        self.decl_slots = {}
+        # top-of-stack caching: a `psh` is held back until we know whether
+        # the very next instruction pops it again. -O0 keeps emitting every
+        # push and pop as written, so its output stays the reference listing
+        self.tos_caching = opt_level >= 1
+        self.pending_push = None
+        self.selector = InstructionSelector(self, 'size' if optimize_size else 'cycles') if opt_level >= 1 else None
         
     def get_generated_code(self) -> str:
-        return self.code;
+        self._flush_pending_push()
+        if self.opt_level < 2:
+            return self.code;
+        
+        program = AsmProgram(self.code)
+        for name, changes in simplify_branches(program):
+            self.log(f"[{self.level_name}] Branch Simplification: {changes} jumps simplified in '{name}'")
+        for folded, kept, saved in fold_identical_functions(program):
+            self.log(f"[{self.level_name}] Identical Code Folding: '{folded}' folded into '{kept}', saved {saved} bytes")
+        if self.optimize_size:
+            total = 0
+            for label, sequence, uses, saved in outline_sequences(program):
+                self.log(f"[Os] Machine Outlining: {label} ({'; '.join(sequence)}) used {uses} times, saved {saved} bytes")
+                total += saved
+            if total:
+                self.log(f"[Os] Machine Outlining: saved {total} bytes in total")
+        return program.render()
+    
+    def _emit(self, line: str):
+        if not self.tos_caching:
+            self.code += line
+            return
+        
+        instr = line.split(';', 1)[0].split()
+        if self.pending_push is not None:
+            pushed_operand, pushed_line = self.pending_push
+            self.pending_push = None
+            if len(instr) == 2 and instr[0] == 'pop':
+                if instr[1] != pushed_operand:
+                    self.code += f"     mov {instr[1]} {pushed_operand}\n"
+                return
+            self.code += pushed_line
+        
+        if len(instr) == 2 and instr[0] == 'psh':
+            self.pending_push = (instr[1], line)
+            return
+        self.code += line
+        
+    def _emit_tile(self, tile):
+        for line in tile.lines:
+            if line in tile.children:
+                self.visit(tile.children[line])
+            else:
+                self._emit(f"     {line}\n")
+    
+    def _var_location(self, var_name: str):
+        if var_name in self.local_vars:
+            var_info = self.local_vars[var_name]
+            if 'reg' in var_info:
+                return ('reg', var_info['reg'])
+            return ('frame', var_info['offset'])
+        return ('global', f"__var_{self._get_current_namespace_prefix()}{var_name}")
+    
+    def _flush_pending_push(self):
+        if self.pending_push is not None:
+            self.code += self.pending_push[1]
+            self.pending_push = None
     
     def _new_label(self, prefix="L") -> str:
         self.label_counter += 1
@@ -61,73 +244,185 @@ class Compiler(ASTVisitor):
             self.used_registers.remove(reg)
     
     def visit_ProgramNode(self, node: ProgramNode):
-        self.code += "; Generated with BoxLang4 \n"
-        self.code += "; BoxLang4 created by arti \n"
-        self.code += "jmp func__start \n";
+        self._emit("; Generated with BoxLang4 \n")
+        self._emit("; BoxLang4 created by arti \n")
+        self._emit("jmp func__start \n");
         for decl in node.declarations:
             self.visit(decl);
         
+        if self.string_pool is not None:
+            self.data_section.extend(self.string_pool.emit())
+            if self.string_pool.bytes_saved() > 0:
+                self.log(f"[{self.level_name}] String Pooling: {self.string_pool.occurrences} literals in "
+                      f"{len(self.string_pool.labels)} entries, saved {self.string_pool.bytes_saved()} bytes")
+        
+        # larger objects first; zero-initialized storage goes to its own block at the end
+        self.data_section = [line for size, line in sorted(self.initialized_data, key=lambda item: -item[0])] + self.data_section
+        
         if self.data_section:
-            self.code += "\n;section data\n";
-            self.code += "\n".join(self.data_section);
+            self._emit("\n;section data\n");
+            self._emit("\n".join(self.data_section));
+        
+        if self.bss_section:
+            self._emit("\n\n;section bss\n");
+            self._emit("\n".join(line for size, line in sorted(self.bss_section, key=lambda item: -item[0])));
 
     def visit_FunctionDeclarationNode(self, node: FunctionDeclarationNode):
         prefix = self._get_current_namespace_prefix()
         name = f"{prefix}{node.name}";
         self.current_func_name = name
-        self.code += f"; Function {name} \n";
-        self.code += f"func_{name}: \n";
+        self._emit(f"; Function {name} \n");
+        self._emit(f"func_{name}: \n");
+        
+        promoted = {}
+        if self.opt_level >= 2:
+            promoted = RegisterAllocator().allocate(node)
         
-        collector = VariableCollector()
+        escapes = EscapeAnalyzer()
+        for stmt in node.body:
+            escapes.visit(stmt)
+        
+        if self.opt_level >= 1:
+            collector = StackSlotAllocator(escapes.escaped, skip=set(promoted))
+        else:
+            collector = VariableCollector()
         
         self.local_vars = {}
         arg_offset = 6
-        for param in node.params:
+        register_params = []
+        for index, param in enumerate(node.params):
+            if index < len(self.arg_registers):
+                register_params.append((param, self.arg_registers[index]))
+                continue
             collector.local_vars[param.param_name] = {'type': param.param_type, 'offset': arg_offset}
             arg_offset += 3
         
-        for stmt in node.body:
-            collector.visit(stmt)
+        # register arguments that stay in memory are pushed right below %bp
+        spilled = [(param, reg) for param, reg in register_params if param.param_name not in promoted]
+        for index, (param, reg) in enumerate(spilled):
+            collector.local_vars[param.param_name] = {'type': param.param_type, 'offset': -3 * (index + 1)}
+        for param, reg in register_params:
+            collector.local_vars.setdefault(param.param_name, {'type': param.param_type})
+        collector.reserve(3 * len(spilled))
+        
+        collector.collect(node.body)
             
         self.local_vars = collector.local_vars
+        self.decl_slots = getattr(collector, 'slots', {})
+        if self.selector:
+            self.selector.reset()
         total_local_size = collector.current_offset
         
+        usages = UsageAnalyzer()
+        for stmt in node.body:
+            usages.visit(stmt)
+        stack_params_in_memory = [param for param in node.params[len(register_params):]
+                                  if param.param_name in usages.usages and param.param_name not in promoted]
+        self.frame_elided = (self.opt_level >= 2 and total_local_size == 0 and not stack_params_in_memory
+                             and not escapes.has_calls and not escapes.asm_blocks)
+        # a frame cannot be torn down early while pointers into it may be live
+        self.tail_calls = self.opt_level >= 2 and not escapes.escaped and not escapes.asm_blocks
+        self.incoming_stack_args = len(node.params) - len(register_params)
+        
         self.in_function = True;
         # prologue
-        self.code += f"     psh %bp\n";
-        self.code += f"     mov %bp %sp\n";
-        if total_local_size > 0:
-            self.code += f"    sub %sp {total_local_size}\n"
+        if not self.frame_elided:
+            self._emit(f"     psh %bp\n");
+            self._emit(f"     mov %bp %sp\n");
+            for param, reg in spilled:
+                self._emit(f"     psh {reg}\n")
+            if total_local_size - 3 * len(spilled) > 0:
+                self._emit(f"    sub %sp {total_local_size - 3 * len(spilled)}\n")
         
-        for stmt in node.body:
-            self.visit(stmt);
+        # callee-saved registers live right below the locals
+        self.saved_registers = []
+        for var_name, reg in promoted.items():
+            save_offset = -(total_local_size + 3 * (len(self.saved_registers) + 1))
+            self.saved_registers.append((reg, save_offset))
+            self._emit(f"     psh {reg}\n")
+        
+        for param, reg in register_params:
+            if param.param_name in promoted:
+                self._emit(f"     mov {promoted[param.param_name]} {reg}\n")
+        
+        for var_name, reg in promoted.items():
+            var_info = self.local_vars[var_name]
+            offset = var_info.get('offset', 0)
+            if offset > 0 and self.frame_elided:
+                # no frame: arguments sit above the return address and the saves
+                self._emit(f"     mov %bs %sp\n")
+                self._emit(f"     add %bs {offset - 3 + 3 * len(self.saved_registers)}\n")
+                self._emit(f"     lh %bs {reg}\n")
+            elif offset > 0:
+                self._emit(f"     mov %bs %bp\n")
+                self._emit(f"     add %bs {offset}\n")
+                self._emit(f"     lh %bs {reg}\n")
+            var_info['reg'] = reg
+        
+        self.param_homes = [self.local_vars[param.param_name] for param in node.params]
+        if self.tail_calls and self._has_self_tail_call(node.body):
+            self._emit(".body:\n")
+        
+        self._compile_block(node.body)
         
-        self.code += ".end:\n" 
-        self.code += f"     mov %sp %bp\n";
-        self.code += f"     pop %bp\n";
-        self.code += f"     ret\n";
+        self._emit(".end:\n")
+        if self.frame_elided:
+            for reg, save_offset in reversed(self.saved_registers):
+                self._emit(f"     pop {reg}\n")
+            self._emit(f"     ret\n");
+        else:
+            for reg, save_offset in self.saved_registers:
+                self._emit(f"     mov %bs %bp\n")
+                self._emit(f"     sub %bs {-save_offset}\n")
+                self._emit(f"     lh %bs {reg}\n")
+            self._emit(f"     mov %sp %bp\n");
+            self._emit(f"     pop %bp\n");
+            self._emit(f"     ret\n");
         
         self.in_function = False;
         self.current_func_name = None
         
+    def _compile_block(self, stmts: list):
+        for stmt in stmts:
+            if isinstance(stmt, FunctionCallNode):
+                self.statement_call = stmt
+            else:
+                self._flush_call_cleanup()
+            self.visit(stmt)
+        self._flush_call_cleanup()
+        
+    def _flush_call_cleanup(self):
+        if self.pending_call_cleanup > 0:
+            self._emit(f"     add %sp {self.pending_call_cleanup}\n")
+            self.pending_call_cleanup = 0
+        
     def visit_FunctionCallNode(self, node: FunctionCallNode):
+        is_statement = node is self.statement_call
+        self.statement_call = None
         
         for arg in reversed(node.args):
             self.visit(arg)
+        for reg in self.arg_registers[:len(node.args)]:
+            self._emit(f"     pop {reg}\n")
         prefix = f"{node.namespace}_" if node.namespace else self._get_current_namespace_prefix()
         call_name = f"{prefix}{node.name}"
-        self.code += f"     jsr func_{call_name}\n";
-        if (len(node.args) > 0):
-            self.code += f"     add %sp {len(node.args) * 3}\n";
+        self._emit(f"     jsr func_{call_name}\n");
+        stack_args = len(node.args[len(self.arg_registers):])
+        if is_statement and self.merge_call_cleanup:
+            # the result is unused and the arguments can go with the next cleanup
+            self.pending_call_cleanup += stack_args * 3
+            return
+        if (stack_args > 0):
+            self._emit(f"     add %sp {stack_args * 3}\n");
         if node.var_type != 'void':
-            self.code += "    psh %ac\n"
+            self._emit("    psh %ac\n")
     
     def visit_AsmNode(self, node: AsmNode):
         original_asm = node.code.strip()
         placeholders = re.findall(r'\((\w+)\)', original_asm)
 
         if not placeholders:
-            self.code += f"     {original_asm}\n"
+            self._emit(f"     {original_asm}\n")
             return
 
         mnemonic = original_asm.split(' ', 1)[0]
@@ -152,35 +447,35 @@ class Compiler(ASTVisitor):
         for var_name in placeholders:
             val_reg = self._acquire_register()
             temp_regs.append(val_reg)
-            self.code += f"    psh {val_reg}\n"
+            self._emit(f"    psh {val_reg}\n")
             addr_reg = self._acquire_register()
-            self.code += f"    psh {addr_reg}\n"
+            self._emit(f"    psh {addr_reg}\n")
 
             
             if var_name in self.local_vars:
                 offset = self.local_vars[var_name]['offset']
                 var_type = self.local_vars[var_name]['type']
-                self.code += f"    mov {addr_reg} %bp\n"
-                if offset > 0: self.code += f"    add {addr_reg} {offset}\n"
-                else: self.code += f"    sub {addr_reg} {-offset}\n"
+                self._emit(f"    mov {addr_reg} %bp\n")
+                if offset > 0: self._emit(f"    add {addr_reg} {offset}\n")
+                else: self._emit(f"    sub {addr_reg} {-offset}\n")
             else:
                 prefix = self._get_current_namespace_prefix();
                 var_name = f"{prefix}{node.variable.var_name}";
-                self.code += f"    mov {addr_reg} __var_{var_name}\n"
+                self._emit(f"    mov {addr_reg} __var_{var_name}\n")
                 
-            if var_type == 'num16': self.code += f"    lw {addr_reg} {val_reg}\n"
-            elif var_type == 'num24': self.code += f"    lh {addr_reg} {val_reg}\n"
-            elif var_type == 'char': self.code += f"    lb {addr_reg} {val_reg}\n"
+            if var_type == 'num16': self._emit(f"    lw {addr_reg} {val_reg}\n")
+            elif var_type == 'num24': self._emit(f"    lh {addr_reg} {val_reg}\n")
+            elif var_type == 'char': self._emit(f"    lb {addr_reg} {val_reg}\n")
             
-            self.code += f"    pop {addr_reg}\n"
+            self._emit(f"    pop {addr_reg}\n")
             self._release_register(addr_reg)
             
             final_asm = final_asm.replace(f'({var_name})', val_reg, 1)
             
-        self.code += f"    {final_asm}\n"
+        self._emit(f"    {final_asm}\n")
          
         for reg in reversed(temp_regs):
-            self.code += f"    pop {reg}\n"
+            self._emit(f"    pop {reg}\n")
             self._release_register(reg)
         
     def visit_NamespaceNode(self, node: NamespaceNode):
@@ -196,30 +491,54 @@ class Compiler(ASTVisitor):
             prefix = self._get_current_namespace_prefix()
             name = f"{prefix}{node.var_name}";
             size = get_size_of_type(node.var_type)
-            self.data_section.append(f"__var_{name}: reserve {size} bytes");
+            value = evaluate_constant(node.value) if node.value is not None else None
+            string = string_constant(node.value) if node.value is not None else None
+            if string is not None:
+                # the literal's label is assembled into the variable as its address
+                value = self._string_label(string.value)
+                line = f"__var_{name}: bytes {value}"
+            elif value is None:
+                line = f"__var_{name}: reserve {size} bytes"
+            else:
+                value = to_twos_complement_24bit(value)
+                line = f"__var_{name}: bytes " + " ".join(str((value >> (8 * i)) & 0xFF) for i in range(size))
+            
+            if self.opt_level < 1:
+                self.data_section.append(line);
+            elif value is None:
+                self.bss_section.append((size, line))
+            else:
+                self.initialized_data.append((size, line))
             return
+        
+        if id(node) in self.decl_slots:
+            self.local_vars[node.var_name] = self.decl_slots[id(node)]
             
         if node.value is not None:
             self.visit(node.value);
             
-            self.code += f"     pop %ac\n";
+            if 'reg' in self.local_vars.get(node.var_name, {}):
+                self._emit(f"     pop {self.local_vars[node.var_name]['reg']}\n");
+                return
+            
+            self._emit(f"     pop %ac\n");
             
             if node.var_name in self.local_vars:
                 offset = self.local_vars[node.var_name]['offset'];
                 var_type = self.local_vars[node.var_name]['type'];
                 
-                self.code += f"     mov %bs %bp\n";
+                self._emit(f"     mov %bs %bp\n");
                 if offset > 0:
-                    self.code += f"     add %bs {offset}\n";
+                    self._emit(f"     add %bs {offset}\n");
                 else:
-                    self.code += f"     sub %bs {-offset}\n";
+                    self._emit(f"     sub %bs {-offset}\n");
                     
                 if var_type == 'num16' or var_type == 'f16':
-                    self.code += "    sw %bs %ac\n"
+                    self._emit("    sw %bs %ac\n")
                 elif var_type.endswith('*') or var_type in ['num24', 'f24']:
-                    self.code += "    sh %bs %ac\n"
+                    self._emit("    sh %bs %ac\n")
                 elif var_type == 'char':
-                    self.code += "    sb %bs %ac\n"
+                    self._emit("    sb %bs %ac\n")
             else:
                 pass
                 
@@ -231,65 +550,72 @@ class Compiler(ASTVisitor):
         
         if isinstance(lvalue, VarAccessNode):
             self.visit(rvalue);
-            self.code += f"     pop %ac\n";
+            if 'reg' in self.local_vars.get(lvalue.var_name, {}):
+                self._emit(f"     pop {self.local_vars[lvalue.var_name]['reg']}\n");
+                return
+            self._emit(f"     pop %ac\n");
             if node.variable.var_name in self.local_vars:
                 offset = self.local_vars[node.variable.var_name]['offset'];
-                self.code += f"     mov %bs %bp\n";
+                self._emit(f"     mov %bs %bp\n");
                 if offset > 0:
-                    self.code += f"     add %bs {offset}\n";
+                    self._emit(f"     add %bs {offset}\n");
                 else:
-                    self.code += f"     sub %bs {-offset}\n";
+                    self._emit(f"     sub %bs {-offset}\n");
             else:
                 prefix = self._get_current_namespace_prefix();
                 var_name = f"{prefix}{node.variable.var_name}";
-                self.code += f"     mov %bs __var_{var_name}\n";
+                self._emit(f"     mov %bs __var_{var_name}\n");
                 
             if (node.variable.var_type == 'num16') or (node.variable.var_type == 'f16'):
-                self.code += f"     sw %bs %ac\n";
+                self._emit(f"     sw %bs %ac\n");
             elif (node.variable.var_type.endswith('*')) or (node.variable.var_type in ['num24', 'f24']):
-                self.code += f"     sh %bs %ac\n";
+                self._emit(f"     sh %bs %ac\n");
             elif (node.variable.var_type == 'char'):
-                self.code += f"     sb %bs %ac\n";
+                self._emit(f"     sb %bs %ac\n");
         elif isinstance(lvalue, UnaryOpNode) and lvalue.op.type == TokenType.STAR:
             self.visit(rvalue);
             self.visit(lvalue.operand);
             
-            self.code += f"     pop %bs\n";
-            self.code += f"     pop %ac\n";
+            self._emit(f"     pop %bs\n");
+            self._emit(f"     pop %ac\n");
             
             pointer_type = lvalue.operand.var_type
             pointed_to_type = pointer_type[:-1];
             
             if pointed_to_type == 'char':
-                self.code += f"     sb %bs %ac\n";
+                self._emit(f"     sb %bs %ac\n");
             elif pointed_to_type == 'num16' or pointed_to_type == 'f16':
-                self.code += f"     sw %bs %ac\n";
+                self._emit(f"     sw %bs %ac\n");
             else:
-                self.code += f"     sh %bs %ac\n";
+                self._emit(f"     sh %bs %ac\n");
         else:
             self._error(lvalue, "Invalid target for assignment.")
             
     def visit_VarAccessNode(self, node: VarAccessNode):
         prefix = self._get_current_namespace_prefix()
+        if 'reg' in self.local_vars.get(node.var_name, {}):
+            self._emit(f"     psh {self.local_vars[node.var_name]['reg']}\n");
+            return node.var_type
+        
         if node.var_name in self.local_vars:
             offset = self.local_vars[node.var_name]['offset'];
-            self.code += f"     mov %bs %bp\n";
+            self._emit(f"     mov %bs %bp\n");
             if offset > 0:
-                self.code += f"     add %bs {offset}\n";
+                self._emit(f"     add %bs {offset}\n");
             else:
-                self.code += f"     sub %bs {-offset}\n";
+                self._emit(f"     sub %bs {-offset}\n");
         else:
             var_name = f"{prefix}{node.var_name}";
-            self.code += f"     mov %bs __var_{var_name}\n";
+            self._emit(f"     mov %bs __var_{var_name}\n");
             
         if (node.var_type == 'num16') or (node.var_type == 'f16'):
-            self.code += f"     lw %bs %ac\n";
+            self._emit(f"     lw %bs %ac\n");
         elif (node.var_type.endswith('*')) or (node.var_type in ['num24', 'f24']):
-            self.code += f"     lh %bs %ac\n";
+            self._emit(f"     lh %bs %ac\n");
         elif (node.var_type == 'char'):
-            self.code += f"     lb %bs %ac\n"
+            self._emit(f"     lb %bs %ac\n")
 
-        self.code += f"     psh %ac\n";
+        self._emit(f"     psh %ac\n");
         
         return node.var_type
         
@@ -301,20 +627,20 @@ class Compiler(ASTVisitor):
             end_label = self._new_label("lor_end")
             
             self.visit(node.left)
-            self.code += "     pop %ac\n"
-            self.code += "     cmp %ac 0\n"
-            self.code += f"     jne {true_label}\n"
+            self._emit("     pop %ac\n")
+            self._emit("     cmp %ac 0\n")
+            self._emit(f"     jne {true_label}\n")
 
             self.visit(node.right)
-            self.code += "     pop %ac\n"
-            self.code += "     cmp %ac 0\n"
-            self.code += f"     jne {true_label}\n"
-
-            self.code += "     psh 0\n"
-            self.code += f"     jmp {end_label}\n"
-            self.code += f"{true_label}:\n"
-            self.code += "     psh 1\n"
-            self.code += f"{end_label}:\n"
+            self._emit("     pop %ac\n")
+            self._emit("     cmp %ac 0\n")
+            self._emit(f"     jne {true_label}\n")
+
+            self._emit("     psh 0\n")
+            self._emit(f"     jmp {end_label}\n")
+            self._emit(f"{true_label}:\n")
+            self._emit("     psh 1\n")
+            self._emit(f"{end_label}:\n")
             return "num24"
 
         if op == TokenType.LOGICAL_AND:
@@ -322,20 +648,20 @@ class Compiler(ASTVisitor):
             end_label = self._new_label("land_end")
 
             self.visit(node.left)
-            self.code += "     pop %ac\n"
-            self.code += "     cmp %ac 0\n"
-            self.code += f"     je {false_label}\n"
+            self._emit("     pop %ac\n")
+            self._emit("     cmp %ac 0\n")
+            self._emit(f"     je {false_label}\n")
 
             self.visit(node.right)
-            self.code += "     pop %ac\n"
-            self.code += "     cmp %ac 0\n"
-            self.code += f"     je {false_label}\n"
-
-            self.code += "     psh 1\n"
-            self.code += f"     jmp {end_label}\n"
-            self.code += f"{false_label}:\n"
-            self.code += "     psh 0\n"
-            self.code += f"{end_label}:\n"
+            self._emit("     pop %ac\n")
+            self._emit("     cmp %ac 0\n")
+            self._emit(f"     je {false_label}\n")
+
+            self._emit("     psh 1\n")
+            self._emit(f"     jmp {end_label}\n")
+            self._emit(f"{false_label}:\n")
+            self._emit("     psh 0\n")
+            self._emit(f"{end_label}:\n")
             return "num24"
         
         simple_comparison_map = {
@@ -351,75 +677,99 @@ class Compiler(ASTVisitor):
         }
         
         if op in simple_comparison_map or op in complex_comparison_map:
-            self.visit(node.right)
-            self.visit(node.left)
-            self.code += "    pop %ac\n"
-            self.code += "    pop %bs\n"
+            rhs = "%bs"
+            if self.selector:
+                tile, op = self.selector.select_binary(node, "cmp")
+                self._emit_tile(tile)
+                rhs = tile.operand
+            else:
+                self.visit(node.right)
+                self.visit(node.left)
+                self._emit("    pop %ac\n")
+                self._emit("    pop %bs\n")
             
             true_label = self._new_label("true")
             end_label = self._new_label("end_cmp")
             
-            self.code += "    cmp %ac %bs\n"
+            if not self.selector:
+                self._emit(f"    cmp %ac {rhs}\n")
             
             if op in simple_comparison_map:
-                self.code += f"    {simple_comparison_map[op]} {true_label}\n"
+                self._emit(f"    {simple_comparison_map[op]} {true_label}\n")
             else:
                 instr1, instr2 = complex_comparison_map[op]
-                self.code += f"    {instr1} {true_label}\n"
-                self.code += "    cmp %ac %bs\n"
-                self.code += f"    {instr2} {true_label}\n"
+                self._emit(f"    {instr1} {true_label}\n")
+                self._emit(f"    cmp %ac {rhs}\n")
+                self._emit(f"    {instr2} {true_label}\n")
 
-            self.code += "    psh 0\n"
-            self.code += f"    jmp {end_label}\n"
-            self.code += f"{true_label}:\n"
-            self.code += "    psh 1\n"
-            self.code += f"{end_label}:\n"
+            self._emit("    psh 0\n")
+            self._emit(f"    jmp {end_label}\n")
+            self._emit(f"{true_label}:\n")
+            self._emit("    psh 1\n")
+            self._emit(f"{end_label}:\n")
             
             return "num24" 
         
+        elif self.selector and op in ALU_MNEMONICS:
+            address_tile = self.selector.select_address(node)
+            if address_tile:
+                self._emit_tile(address_tile)
+            else:
+                tile, _ = self.selector.select_binary(node, ALU_MNEMONICS[op])
+                self._emit_tile(tile)
+            self._emit(f"     psh %ac\n");
+            return node.var_type
+        
         else:
             self.visit(node.right);
             left_type = self.visit(node.left);
             
-            self.code += f"     pop %ac\n"; # left
-            self.code += f"     pop %bs\n"; # right
+            self._emit(f"     pop %ac\n"); # left
+            self._emit(f"     pop %bs\n"); # right
             
             if op == TokenType.PLUS:
-                self.code += f"     add %ac %bs\n";
+                self._emit(f"     add %ac %bs\n");
             elif op == TokenType.MINUS:
-                self.code += f"     sub %ac %bs\n";
+                self._emit(f"     sub %ac %bs\n");
             elif op == TokenType.STAR:
-                self.code += f"     mul %ac %bs\n";
+                self._emit(f"     mul %ac %bs\n");
             elif op == TokenType.SLASH:
-                self.code += f"     div %ac %bs\n";
+                self._emit(f"     div %ac %bs\n");
             elif op == TokenType.AMPERSAND: 
-                self.code += f"  and %ac %bs\n";
+                self._emit(f"  and %ac %bs\n");
             elif op == TokenType.BITWISE_OR: 
-                self.code += f"   or %ac %bs\n";
+                self._emit(f"   or %ac %bs\n");
             elif op == TokenType.BITWISE_XOR: 
-                self.code += f"  xor %ac %bs\n";
+                self._emit(f"  xor %ac %bs\n");
             else:
                 pass
             
-            self.code += f"     psh %ac\n";
+            self._emit(f"     psh %ac\n");
             return left_type
         
-    def visit_StringLiteralNode(self, node: StringLiteralNode):
+    def _string_label(self, value: str) -> str:
+        if self.string_pool is not None:
+            return self.string_pool.intern(value)
+        
         label = f"__str_{self.str_counter}";
         self.str_counter += 1;
-        self.data_section.append(f'{label}: bytes "{node.value}" 0');
-        self.code += f"     mov %ac {label}\n";
-        self.code += f"     psh %ac\n";
+        self.data_section.append(f'{label}: bytes "{value}" 0');
+        return label
+        
+    def visit_StringLiteralNode(self, node: StringLiteralNode):
+        label = self._string_label(node.value)
+        self._emit(f"     mov %ac {label}\n");
+        self._emit(f"     psh %ac\n");
         return 'char*';
         
     def visit_NumberLiteralNode(self, node: NumberLiteralNode):
         value = int(node.value)
         unsigned_value = to_twos_complement_24bit(value)
-        self.code += f"     psh {unsigned_value}    ; {value}\n";
+        self._emit(f"     psh {unsigned_value}    ; {value}\n");
         return 'num24';
         
     def visit_CharLiteralNode(self, node: CharLiteralNode):
-        self.code += f"     psh {node.value}\n";
+        self._emit(f"     psh {node.value}\n");
         return 'char';
         
     def visit_UnaryOpNode(self, node: UnaryOpNode):
@@ -433,82 +783,227 @@ class Compiler(ASTVisitor):
             
             if var_name in self.local_vars:
                 offset = self.local_vars[var_name]['offset']
-                self.code += "    mov %ac %bp\n"
-                if offset > 0: self.code += f"    add %ac {offset}\n"
-                else: self.code += f"    sub %ac {-offset}\n"
+                self._emit("    mov %ac %bp\n")
+                if offset > 0: self._emit(f"    add %ac {offset}\n")
+                else: self._emit(f"    sub %ac {-offset}\n")
             else:
                 prefix = self._get_current_namespace_prefix()
-                name = f"{prefix}{node.var_name}";
-                self.code += f"    mov %ac __var_{name}\n"
+                name = f"{prefix}{var_name}";
+                self._emit(f"    mov %ac __var_{name}\n")
             
-            self.code += "    psh %ac\n"
+            self._emit("    psh %ac\n")
 
+        elif op_type == TokenType.STAR and self.selector:
+            self._emit_tile(self.selector.select_load(node))
+            self._emit("    psh %ac\n")
+            
         elif op_type == TokenType.STAR:
             self.visit(node.operand)
             
             pointed_to_type = node.var_type 
             
-            self.code += "    pop %bs\n"
+            self._emit("    pop %bs\n")
         
             if pointed_to_type == 'num16' or pointed_to_type == 'f16':
-                self.code += "    lw %bs %ac\n"
+                self._emit("    lw %bs %ac\n")
             elif pointed_to_type.endswith('*') or pointed_to_type in ['num24', 'f24']:
-                self.code += "    lh %bs %ac\n"
+                self._emit("    lh %bs %ac\n")
             elif pointed_to_type == 'char':
-                self.code += "    lb %bs %ac\n"
+                self._emit("    lb %bs %ac\n")
             
-            self.code += "    psh %ac\n"
+            self._emit("    psh %ac\n")
             
     def visit_TypeCastNode(self, node: TypeCastNode):
         self.visit(node.expression);
         return node.target_type;
     
+    def _tail_call_name(self, node: ReturnNode):
+        if not isinstance(node.value, FunctionCallNode):
+            return None
+        prefix = f"{node.value.namespace}_" if node.value.namespace else self._get_current_namespace_prefix()
+        return f"{prefix}{node.value.name}"
+    
+    def _has_self_tail_call(self, stmts: list) -> bool:
+        for stmt in stmts:
+            if isinstance(stmt, ReturnNode) and self._tail_call_name(stmt) == self.current_func_name:
+                return True
+            for field in ['then_branch', 'else_branch', 'body', 'default_case']:
+                if self._has_self_tail_call(getattr(stmt, field, None) or []):
+                    return True
+            for case_node in getattr(stmt, 'cases', None) or []:
+                if self._has_self_tail_call(case_node.body):
+                    return True
+        return False
+    
+    def _compile_tail_call(self, node: ReturnNode) -> bool:
+        """Compiles `ret f[...]` as a jump. A self call rewrites the parameters and
+        loops back to .body; a sibling call rewrites the incoming argument slots,
+        tears down this frame and jumps to the callee, which returns to our caller."""
+        call = node.value
+        call_name = self._tail_call_name(node)
+        
+        if call_name == self.current_func_name:
+            for arg in reversed(call.args):
+                self.visit(arg)
+            for home in self.param_homes:
+                if 'reg' in home:
+                    self._emit(f"     pop {home['reg']}\n")
+                elif self.frame_elided:
+                    # parameter is never read
+                    self._emit(f"     pop %ac\n")
+                else:
+                    self._emit(f"     pop %ac\n")
+                    self._emit(f"     mov %bs %bp\n")
+                    if home['offset'] > 0:
+                        self._emit(f"     add %bs {home['offset']}\n")
+                    else:
+                        self._emit(f"     sub %bs {-home['offset']}\n")
+                    self._emit(f"     sh %bs %ac\n")
+            self._emit(f"    jmp .body\n")
+            return True
+        
+        register_args = call.args[:len(self.arg_registers)]
+        stack_args = call.args[len(self.arg_registers):]
+        if stack_args:
+            # the callee's arguments have to fit into our incoming ones
+            if self.frame_elided or len(stack_args) > self.incoming_stack_args:
+                return False
+            # register arguments are evaluated first here, so keep calls in order
+            side_effects = EscapeAnalyzer()
+            for arg in call.args:
+                side_effects.visit(arg)
+            if side_effects.has_calls:
+                return False
+        
+        for arg in reversed(register_args):
+            self.visit(arg)
+        for arg in reversed(stack_args):
+            self.visit(arg)
+        for index in range(len(stack_args)):
+            self._emit(f"     pop %ac\n")
+            self._emit(f"     mov %bs %bp\n")
+            self._emit(f"     add %bs {6 + 3 * index}\n")
+            self._emit(f"     sh %bs %ac\n")
+        for reg in self.arg_registers[:len(register_args)]:
+            self._emit(f"     pop {reg}\n")
+        
+        if self.frame_elided:
+            for reg, save_offset in reversed(self.saved_registers):
+                self._emit(f"     pop {reg}\n")
+        else:
+            # %ac and %bs already hold arguments, so each register restores itself
+            for reg, save_offset in self.saved_registers:
+                self._emit(f"     mov {reg} %bp\n")
+                self._emit(f"     sub {reg} {-save_offset}\n")
+                self._emit(f"     lh {reg} {reg}\n")
+            self._emit(f"     mov %sp %bp\n")
+            self._emit(f"     pop %bp\n")
+        self._emit(f"    jmp func_{call_name}\n")
+        return True
+        
     def visit_ReturnNode(self, node: ReturnNode):
+        if self.in_function and self.tail_calls and self._tail_call_name(node):
+            if self._compile_tail_call(node):
+                return
+        
         if node.value:
             self.visit(node.value)
-            self.code += "    pop %ac\n"
+            self._emit("    pop %ac\n")
+        
+        self._emit(f"    jmp .end\n")
+        
+    def _compile_branch(self, condition: ExpressionNode, target: str, jump_if: bool):
+        """Jumps to `target` when the condition's truth equals `jump_if` and falls
+        through otherwise, branching on the flags of comparisons directly instead
+        of materializing 0/1 and testing it."""
+        value = evaluate_constant(condition)
+        if value is not None:
+            if (value != 0) == jump_if:
+                self._emit(f"    jmp {target}\n")
+            return
+        
+        op = condition.op.type if isinstance(condition, BinaryOpNode) else None
+        if op in (TokenType.LOGICAL_AND, TokenType.LOGICAL_OR):
+            if (op == TokenType.LOGICAL_OR) == jump_if:
+                # either operand decides on its own
+                self._compile_branch(condition.left, target, jump_if)
+                self._compile_branch(condition.right, target, jump_if)
+            else:
+                skip_label = self._new_label("skip")
+                self._compile_branch(condition.left, skip_label, not jump_if)
+                self._compile_branch(condition.right, target, jump_if)
+                self._emit(f"{skip_label}:\n")
+            return
+        
+        if op not in BRANCHES_IF_TRUE:
+            self.visit(condition)
+            self._emit("     pop %ac\n")
+            self._emit("     cmp %ac 0\n")
+            self._emit(f"     {'jne' if jump_if else 'je'} {target}\n")
+            return
         
-        self.code += f"    jmp .end\n"
+        tile, op = self.selector.select_binary(condition, "cmp")
+        self._emit_tile(tile)
+        jumps = BRANCHES_IF_TRUE[op] if jump_if else BRANCHES_IF_FALSE[op]
+        for index, jump in enumerate(jumps):
+            if index > 0:
+                self._emit(f"    cmp %ac {tile.operand}\n")
+            self._emit(f"    {jump} {target}\n")
         
     def visit_IfNode(self, node: IfNode):
         else_label = self._new_label("else")
         end_if_label = self._new_label("endif")
-
-        self.visit(node.condition)
-        self.code += "     pop %ac\n"
-        self.code += "     cmp %ac 0\n"
-
         target_label_on_false = else_label if node.else_branch else end_if_label
-        self.code += f"     je {target_label_on_false}\n"
 
-        for stmt in node.then_branch:
-            self.visit(stmt)
+        if self.opt_level >= 2:
+            # the then branch is laid out as the fall-through path
+            self._compile_branch(node.condition, target_label_on_false, False)
+            self._compile_if_branches(node, else_label, end_if_label)
+            return
+
+        self.visit(node.condition)
+        self._emit("     pop %ac\n")
+        self._emit("     cmp %ac 0\n")
+        self._emit(f"     je {target_label_on_false}\n")
+        self._compile_if_branches(node, else_label, end_if_label)
+        
+    def _compile_if_branches(self, node: IfNode, else_label: str, end_if_label: str):
+        self._compile_block(node.then_branch)
 
         if node.else_branch:
-            self.code += f"     jmp {end_if_label}\n"
-            self.code += f"{else_label}:\n"
-            for stmt in node.else_branch:
-                self.visit(stmt)
+            self._emit(f"     jmp {end_if_label}\n")
+            self._emit(f"{else_label}:\n")
+            self._compile_block(node.else_branch)
 
-        self.code += f"{end_if_label}:\n"
+        self._emit(f"{end_if_label}:\n")
         
     def visit_WhileNode(self, node: WhileNode):
         start_label = self._new_label("while_start")
         end_label = self._new_label("while_end")
+        
+        if self.opt_level >= 2:
+            # rotated: enter at the test, which sits at the bottom and jumps
+            # back to the body, so each iteration takes one branch
+            test_label = self._new_label("while_test")
+            self._emit(f"    jmp {test_label}\n")
+            self._emit(f"{start_label}:\n")
+            self._compile_block(node.body)
+            self._emit(f"{test_label}:\n")
+            self._compile_branch(node.condition, start_label, True)
+            return
 
-        self.code += f"{start_label}:\n"
+        self._emit(f"{start_label}:\n")
 
         self.visit(node.condition)
-        self.code += "    pop %ac\n"
-        self.code += "    cmp %ac 0\n"
-        self.code += f"    je {end_label}\n"
+        self._emit("    pop %ac\n")
+        self._emit("    cmp %ac 0\n")
+        self._emit(f"    je {end_label}\n")
 
-        for stmt in node.body:
-            self.visit(stmt)
+        self._compile_block(node.body)
 
-        self.code += f"    jmp {start_label}\n"
+        self._emit(f"    jmp {start_label}\n")
 
-        self.code += f"{end_label}:\n"
+        self._emit(f"{end_label}:\n")
         
     def visit_SwitchNode(self, node: SwitchNode):
         end_switch_label = self._new_label("switch_end")
@@ -521,33 +1016,31 @@ class Compiler(ASTVisitor):
         for i, case_node in enumerate(node.cases):
             case_body_label = case_labels[i]
 
-            self.code += "     pop %ac\n"
-            self.code += "     psh %ac\n"
-            self.code += "     psh %ac\n"
+            self._emit("     pop %ac\n")
+            self._emit("     psh %ac\n")
+            self._emit("     psh %ac\n")
 
             self.visit(case_node.value)
-            self.code += "     pop %bs\n"
+            self._emit("     pop %bs\n")
 
-            self.code += "     pop %ac\n"
-            self.code += "     cmp %ac %bs\n"
-            self.code += f"    je {case_body_label}\n"
+            self._emit("     pop %ac\n")
+            self._emit("     cmp %ac %bs\n")
+            self._emit(f"    je {case_body_label}\n")
 
-        self.code += "     add %sp 3\n"
-        self.code += f"    jmp {default_label}\n"
+        self._emit("     add %sp 3\n")
+        self._emit(f"    jmp {default_label}\n")
 
         for i, case_node in enumerate(node.cases):
-            self.code += f"{case_labels[i]}:\n"
+            self._emit(f"{case_labels[i]}:\n")
             
-            self.code += "     add %sp 3\n"
+            self._emit("     add %sp 3\n")
             
-            for stmt in case_node.body:
-                self.visit(stmt)
+            self._compile_block(case_node.body)
                 
-            self.code += f"    jmp {end_switch_label}\n"
+            self._emit(f"    jmp {end_switch_label}\n")
 
         if node.default_case:
-            self.code += f"{default_label}:\n"
-            for stmt in node.default_case:
-                self.visit(stmt)
+            self._emit(f"{default_label}:\n")
+            self._compile_block(node.default_case)
 
-        self.code += f"{end_switch_label}:\n"
\ No newline at end of file
+        self._emit(f"{end_switch_label}:\n")
\ No newline at end of file
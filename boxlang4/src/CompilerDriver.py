@@ -0,0 +1,126 @@
+from src.AST import ParserError, SemanticError
+from src.ErrorReporter import ErrorReporter
+from src.Preprocessor import Preprocessor
+from src.Lexer import Lexer
+from src.Parser import Parser
+from src.SemanticAnalyzer import SemanticAnalyzer
+from src.Optimizer import Optimizer
+from src.Compiler import Compiler
+from src.Instrumentation import CompileReport
+
+# stages compile_source can stop at, in pipeline order
+STAGES = ["lexer", "parser", "semantic", "optimizer"]
+
+class CompileResult:
+    """Outcome of one compile_source call. `assembly` is set when the build
+    succeeded; otherwise `failed_stage` names the stage that stopped it and
+    `diagnostics` holds what the ErrorReporter collected."""
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.assembly = None
+        self.ast = None
+        self.tokens = []
+        self.diagnostics = []
+        # optimization reports, one line each
+        self.messages = []
+        self.included_files = []
+        self.defines = {}
+        self.failed_stage = None
+        self.error = None
+        self.cached = False
+
+    @property
+    def success(self) -> bool:
+        return self.failed_stage is None
+
+def compile_source(text: str, filename: str = "<input>", includes_resolver=None, defines: dict = None,
+                   opt_level: int = 0, optimize_size: bool = False, abi: str = "auto", unroll_threshold: int = 128,
+                   echo: bool = False, report: CompileReport = None, cache=None, parse_only: bool = False) -> CompileResult:
+    """Compiles BoxLang4 source text to LC24 assembly.
+
+    `includes_resolver(path, is_library)` returns (filename, lines) for an
+    $include, or None if it does not exist; by default files are read from
+    disk. `defines` seeds the preprocessor. Every call works on its own
+    objects, so calls may run concurrently from several threads. With
+    `echo`, diagnostics go to stderr and optimization reports to stdout as
+    they happen, the way the command line compiler prints them. A `cache`
+    (CompileCache) is consulted after preprocessing and filled on success.
+    `parse_only` stops after parsing, leaving the tree in `ast`."""
+    result = CompileResult(filename)
+    report = report or CompileReport()
+    error_reporter = ErrorReporter(echo=echo)
+
+    def log(line: str):
+        result.messages.append(line)
+        if echo:
+            print(line)
+
+    def fail(stage: str) -> CompileResult:
+        result.failed_stage = stage
+        result.diagnostics = error_reporter.get_diagnostics()
+        return result
+
+    source_lines = text.splitlines(keepends=True)
+    error_reporter.load_source_file(filename, source_lines)
+
+    with report.phase("Preprocessor"):
+        prep = Preprocessor(error_reporter, includes_resolver, defines)
+        prep_data = prep.process(source_lines, filename)
+        result.defines = prep.get_defines()
+        result.included_files = list(prep.included_files)
+
+    if optimize_size:
+        opt_level = 2
+    if abi == "auto":
+        abi = "fast" if opt_level >= 2 else "stack"
+
+    cache_key = None
+    if cache is not None and not parse_only and not error_reporter.had_error():
+        options = {"opt_level": opt_level, "optimize_size": optimize_size, "abi": abi, "unroll_threshold": unroll_threshold}
+        cache_key = cache.key(text, prep.included_sources, result.defines, options)
+        cached_code = cache.get(cache_key)
+        if cached_code is not None:
+            result.assembly = cached_code
+            result.cached = True
+            return result
+
+    with report.phase("Lexer"):
+        lexer = Lexer(prep_data, error_reporter)
+        result.tokens = lexer.tokenize()
+    if error_reporter.had_error():
+        return fail("lexer")
+
+    try:
+        with report.phase("Parser"):
+            parser = Parser(result.tokens, error_reporter)
+            parser.set_defines(result.defines)
+            result.ast = parser.parse()
+    except ParserError:
+        return fail("parser")
+    if error_reporter.had_error() or result.ast is None:
+        return fail("parser")
+    if parse_only:
+        return result
+
+    try:
+        with report.phase("SemanticAnalyzer"):
+            SemanticAnalyzer(error_reporter).visit(result.ast)
+    except SemanticError:
+        return fail("semantic")
+
+    if opt_level > 0:
+        try:
+            with report.phase("Optimizer"):
+                Optimizer(level=opt_level, unroll_threshold=unroll_threshold, log=log).optimize(result.ast)
+        except Exception as e:
+            result.error = str(e)
+            return fail("optimizer")
+
+    with report.phase("Compiler"):
+        compiler = Compiler(error_reporter, opt_level=opt_level, abi=abi, optimize_size=optimize_size, log=log)
+        compiler.visit(result.ast)
+        result.assembly = compiler.get_generated_code()
+
+    if cache_key is not None:
+        cache.put(cache_key, result.assembly)
+    return result
@@ -0,0 +1,206 @@
+from src.ASTVisitor import ASTVisitor
+from src.AST import *
+from src.RegisterAllocator import EscapeAnalyzer
+from src.ValueNumbering import DeclaredNames
+from src.utils import evaluate_constant
+
+class ReadCollector(ASTVisitor):
+    """Variables an expression reads, and whether it calls anything."""
+    def __init__(self):
+        self.reads = set()
+        self.has_calls = False
+
+    def visit_VarAccessNode(self, node: VarAccessNode):
+        self.reads.add(node.var_name)
+
+    def visit_FunctionCallNode(self, node: FunctionCallNode):
+        self.has_calls = True
+        self.generic_visit(node)
+
+    def generic_visit(self, node):
+        for field in vars(node).values():
+            if isinstance(field, list):
+                for item in field:
+                    if isinstance(item, ASTNode):
+                        self.visit(item)
+            elif isinstance(field, ASTNode):
+                self.visit(field)
+
+def reads_of(node) -> ReadCollector:
+    """Runs a ReadCollector over `node`, which may be None."""
+    collector = ReadCollector()
+    if node is not None:
+        collector.visit(node)
+    return collector
+
+class DeadCodeEliminator:
+    """Removes code that cannot run or whose result is never used:
+
+    - statements after a `ret` (or an `if` whose branches all return)
+    - the untaken side of an `if` with a constant condition, `while [0]` loops
+    - stores to locals that are overwritten or go out of use before any read
+
+    Liveness is computed backwards over the structured control flow, with
+    loops iterated to a fixed point. Only locals whose address is never
+    taken are tracked; asm blocks make every variable live and are never
+    removed. Stores whose value contains a call are kept for the call."""
+
+    def __init__(self):
+        self.removed = []
+
+    def run(self, node: ProgramNode):
+        self._run_declarations(node.declarations)
+        return node
+
+    def _run_declarations(self, declarations: list):
+        for decl in declarations:
+            if isinstance(decl, FunctionDeclarationNode):
+                self.run_function(decl)
+            elif isinstance(decl, NamespaceNode):
+                self._run_declarations(decl.body)
+
+    def run_function(self, node: FunctionDeclarationNode):
+        escapes = EscapeAnalyzer()
+        declared = DeclaredNames()
+        for stmt in node.body:
+            escapes.visit(stmt)
+            declared.visit(stmt)
+        self.tracked = (declared.names | {param.param_name for param in node.params}) - escapes.escaped
+        self.unreachable = 0
+        self.dead_stores = 0
+
+        self._prune_block(node.body)
+        self._live_before(node.body, set(), mutate=True)
+        if self.unreachable or self.dead_stores:
+            self.removed.append((node.name, self.unreachable, self.dead_stores))
+
+    # --- unreachable code ---------------------------------------------------------
+
+    def _terminates(self, stmts: list) -> bool:
+        for stmt in stmts:
+            if isinstance(stmt, ReturnNode):
+                return True
+            if isinstance(stmt, IfNode) and stmt.else_branch and \
+               self._terminates(stmt.then_branch) and self._terminates(stmt.else_branch):
+                return True
+        return False
+
+    def _prune_block(self, stmts: list):
+        result = []
+        reachable = True
+        for stmt in stmts:
+            if not reachable:
+                # asm may be the target of a jump written in asm
+                if isinstance(stmt, AsmNode):
+                    result.append(stmt)
+                else:
+                    self.unreachable += 1
+                continue
+
+            if isinstance(stmt, IfNode):
+                condition = evaluate_constant(stmt.condition)
+                if condition is not None:
+                    taken = stmt.then_branch if condition != 0 else (stmt.else_branch or [])
+                    self.unreachable += 1
+                    self._prune_block(taken)
+                    result.extend(taken)
+                    reachable = not self._terminates(taken)
+                    continue
+                self._prune_block(stmt.then_branch)
+                if stmt.else_branch:
+                    self._prune_block(stmt.else_branch)
+            elif isinstance(stmt, WhileNode):
+                if evaluate_constant(stmt.condition) == 0 and not self._contains_asm(stmt.body):
+                    self.unreachable += 1
+                    continue
+                self._prune_block(stmt.body)
+            elif isinstance(stmt, SwitchNode):
+                for case_node in stmt.cases:
+                    self._prune_block(case_node.body)
+                if stmt.default_case:
+                    self._prune_block(stmt.default_case)
+
+            result.append(stmt)
+            if isinstance(stmt, ReturnNode) or (isinstance(stmt, IfNode) and self._terminates([stmt])):
+                reachable = False
+        stmts[:] = result
+
+    def _contains_asm(self, stmts: list) -> bool:
+        escapes = EscapeAnalyzer()
+        for stmt in stmts:
+            escapes.visit(stmt)
+        return bool(escapes.asm_blocks)
+
+    # --- dead stores ------------------------------------------------------------------
+
+    def _live_before(self, stmts: list, live: set, mutate: bool) -> set:
+        """Returns the tracked variables live on entry to `stmts` given those
+        live after it; with `mutate`, drops the dead stores found on the way."""
+        live = set(live)
+        keep = []
+        for stmt in reversed(stmts):
+            live, dead = self._transfer(stmt, live, mutate)
+            if dead and mutate:
+                self.dead_stores += 1
+                continue
+            keep.append(stmt)
+        if mutate:
+            stmts[:] = reversed(keep)
+        return live
+
+    def _transfer(self, stmt, live: set, mutate: bool):
+        """Returns (live before stmt, whether stmt is a removable dead store)."""
+        if isinstance(stmt, AssignmentNode):
+            value = reads_of(stmt.expression)
+            if isinstance(stmt.variable, VarAccessNode):
+                name = stmt.variable.var_name
+                if name in self.tracked and name not in live and not value.has_calls:
+                    return live, True
+                return (live - {name}) | value.reads, False
+            return live | value.reads | reads_of(stmt.variable).reads, False
+
+        if isinstance(stmt, VarDeclarationNode):
+            if stmt.value is None:
+                return live - {stmt.var_name}, False
+            value = reads_of(stmt.value)
+            if stmt.var_name in self.tracked and stmt.var_name not in live and not value.has_calls:
+                # the declaration itself stays, only the store goes
+                if mutate:
+                    stmt.value = None
+                    self.dead_stores += 1
+                return live - {stmt.var_name}, False
+            return (live - {stmt.var_name}) | value.reads, False
+
+        if isinstance(stmt, ReturnNode):
+            return reads_of(stmt.value).reads, False
+
+        if isinstance(stmt, IfNode):
+            then_live = self._live_before(stmt.then_branch, live, mutate)
+            else_live = self._live_before(stmt.else_branch, live, mutate) if stmt.else_branch else live
+            return then_live | else_live | reads_of(stmt.condition).reads, False
+
+        if isinstance(stmt, WhileNode):
+            condition = reads_of(stmt.condition).reads
+            loop_live = live | condition
+            while True:
+                body_live = self._live_before(stmt.body, loop_live, mutate=False)
+                updated = loop_live | body_live
+                if updated == loop_live:
+                    break
+                loop_live = updated
+            if mutate:
+                self._live_before(stmt.body, loop_live, mutate=True)
+            return loop_live, False
+
+        if isinstance(stmt, SwitchNode):
+            result = set(live) if not stmt.default_case else set()
+            for case_node in stmt.cases:
+                result |= self._live_before(case_node.body, live, mutate)
+            if stmt.default_case:
+                result |= self._live_before(stmt.default_case, live, mutate)
+            return result | reads_of(stmt.expression).reads, False
+
+        if isinstance(stmt, AsmNode):
+            return live | self.tracked, False
+
+        return live | reads_of(stmt).reads, False
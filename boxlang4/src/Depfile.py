@@ -0,0 +1,21 @@
+import os
+
+def depfile_path(output: str) -> str:
+    """Where -MD puts the depfile of `output`: next to it, ending in .d."""
+    return os.path.splitext(output)[0] + ".d"
+
+def _escape(path: str) -> str:
+    return path.replace("$", "$$").replace("#", "\\#").replace(" ", "\\ ")
+
+def format_depfile(target: str, dependencies: list) -> str:
+    """A Makefile rule `target: dependencies` as make and ninja read it,
+    one dependency per continued line. Duplicates are dropped."""
+    lines = [f"{_escape(target)}:"]
+    for path in dict.fromkeys(dependencies):
+        lines[-1] += " \\"
+        lines.append(f"  {_escape(path)}")
+    return "\n".join(lines) + "\n"
+
+def write_depfile(path: str, target: str, dependencies: list):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(format_depfile(target, dependencies))
@@ -0,0 +1,230 @@
+import re
+from src.InstructionSelector import instruction_cost
+
+MASK24 = (1 << 24) - 1
+RETURN_SENTINEL = MASK24
+
+LOAD_SIZES = {'lb': 1, 'lw': 2, 'lh': 3}
+STORE_SIZES = {'sb': 1, 'sw': 2, 'sh': 3}
+STRING_ESCAPES = {'n': 10, 't': 9, 'r': 13, '0': 0, '\\': 92, '"': 34, "'": 39}
+
+class EmulatorError(Exception):
+    pass
+
+def _decode_string(raw: str) -> bytes:
+    out = bytearray()
+    i = 0
+    while i < len(raw):
+        ch = raw[i]
+        if ch == '\\' and i + 1 < len(raw):
+            escape = raw[i + 1]
+            if escape == 'x':
+                out.append(int(raw[i + 2:i + 4], 16))
+                i += 4
+                continue
+            out.append(STRING_ESCAPES.get(escape, ord(escape)))
+            i += 2
+            continue
+        out.append(ord(ch))
+        i += 1
+    return bytes(out)
+
+def _to_signed(value: int) -> int:
+    value &= MASK24
+    return value - (1 << 24) if value & 0x800000 else value
+
+class Emulator:
+    """Instruction-level LC24 emulator for the assembly the compiler emits.
+
+    Code and data labels share one namespace; `.local` labels are scoped to
+    the last global label that does not start with '_'. Data from `bytes`
+    and `reserve` directives is placed from `data_base` upwards; a label
+    in `bytes` assembles to its 24-bit address. The stack grows down from
+    the top of memory. `int $2` pops a character to
+    `output`, `int $0` pops the exit code and halts; returning from the
+    entry point halts as well. Every executed instruction adds its
+    estimated cost from LC24_COSTS to `cycles`."""
+    REGISTERS = ['%ac', '%bs', '%cn', '%dc', '%dt', '%di', '%sp', '%bp']
+
+    def __init__(self, asm: str, memory_size: int = 1 << 20, data_base: int = 0x100, max_steps: int = 10_000_000):
+        self.memory = bytearray(memory_size)
+        self.data_base = data_base
+        self.max_steps = max_steps
+        self.instructions = []
+        self.labels = {}
+        self.output = bytearray()
+        self.steps = 0
+        self.cycles = 0
+        self.mnemonic_counts = {}
+        self.exit_code = None
+        self._load(asm)
+
+    # --- loading ------------------------------------------------------------------
+
+    def _load(self, asm: str):
+        data_ptr = self.data_base
+        scope = ""
+        # (address, label, scope) of labels used as data, patched once all are known
+        self.data_labels = []
+        for raw_line in asm.splitlines():
+            line = self._strip_comment(raw_line).strip()
+            if not line:
+                continue
+            match = re.match(r'^([.\w]+):\s*(.*)$', line)
+            if match:
+                name, line = match.group(1), match.group(2)
+                full_name = scope + name if name.startswith('.') else name
+                if not name.startswith(('.', '_')):
+                    scope = name
+                is_data = line.startswith(('reserve', 'bytes'))
+                self.labels[full_name] = data_ptr if is_data else len(self.instructions)
+                if not line:
+                    continue
+            if line.startswith(('reserve', 'bytes')):
+                data_ptr = self._place_data(line, data_ptr, scope)
+                continue
+            parts = line.split()
+            cycles = instruction_cost(line)[1]
+            self.instructions.append((parts[0], parts[1:], scope, cycles))
+        for address, name, scope in self.data_labels:
+            self._store_memory(address, self._label(name, scope), 3)
+
+    def _strip_comment(self, line: str) -> str:
+        in_string = False
+        for i, ch in enumerate(line):
+            if ch == '"':
+                in_string = not in_string
+            elif ch == ';' and not in_string:
+                return line[:i]
+        return line
+
+    def _place_data(self, directive: str, ptr: int, scope: str = "") -> int:
+        if directive.startswith('reserve'):
+            return ptr + int(directive.split()[1])
+        body = directive[len('bytes'):].strip()
+        for string, number in re.findall(r'"((?:[^"\\]|\\.)*)"|(\S+)', body):
+            if number and re.match(r'^[._a-zA-Z]', number):
+                self.data_labels.append((ptr, number, scope))
+                ptr += 3
+            elif number:
+                self.memory[ptr] = int(number, 0) & 0xFF
+                ptr += 1
+            else:
+                data = _decode_string(string)
+                self.memory[ptr:ptr + len(data)] = data
+                ptr += len(data)
+        return ptr
+
+    # --- operands and memory ----------------------------------------------------------
+
+    def _label(self, name: str, scope: str) -> int:
+        full_name = scope + name if name.startswith('.') else name
+        if full_name not in self.labels:
+            raise EmulatorError(f"undefined label '{name}'")
+        return self.labels[full_name]
+
+    def _value(self, operand: str, scope: str) -> int:
+        if operand in self.registers:
+            return self.registers[operand]
+        if operand.startswith('$'):
+            return int(operand[1:], 16)
+        if re.match(r'^-?(0x[0-9a-fA-F]+|\d+)$', operand):
+            return int(operand, 0) & MASK24
+        return self._label(operand, scope)
+
+    def _register(self, operand: str) -> str:
+        if operand not in self.registers:
+            raise EmulatorError(f"unknown register '{operand}'")
+        return operand
+
+    def _load_memory(self, address: int, size: int) -> int:
+        return int.from_bytes(self.memory[address:address + size], 'little')
+
+    def _store_memory(self, address: int, value: int, size: int):
+        self.memory[address:address + size] = (value & ((1 << (8 * size)) - 1)).to_bytes(size, 'little')
+
+    def _push(self, value: int):
+        self.registers['%sp'] = (self.registers['%sp'] - 3) & MASK24
+        self._store_memory(self.registers['%sp'], value, 3)
+
+    def _pop(self) -> int:
+        value = self._load_memory(self.registers['%sp'], 3)
+        self.registers['%sp'] = (self.registers['%sp'] + 3) & MASK24
+        return value
+
+    # --- execution ---------------------------------------------------------------------
+
+    def run(self) -> str:
+        """Runs from the first instruction and returns what the program printed."""
+        self.registers = {reg: 0 for reg in self.REGISTERS}
+        self.registers['%sp'] = len(self.memory) - 3
+        self._push(RETURN_SENTINEL)
+        self.flags = 0
+        pc = 0
+        while pc != RETURN_SENTINEL and pc < len(self.instructions):
+            if self.steps >= self.max_steps:
+                raise EmulatorError(f"step limit of {self.max_steps} exceeded")
+            op, args, scope, cycles = self.instructions[pc]
+            self.steps += 1
+            self.cycles += cycles
+            self.mnemonic_counts[op] = self.mnemonic_counts.get(op, 0) + 1
+            pc += 1
+
+            if op == 'psh':
+                self._push(self._value(args[0], scope))
+            elif op == 'pop':
+                self.registers[self._register(args[0])] = self._pop()
+            elif op == 'mov':
+                self.registers[self._register(args[0])] = self._value(args[1], scope) & MASK24
+            elif op in ('add', 'sub', 'mul', 'div', 'and', 'or', 'xor'):
+                left = self.registers[self._register(args[0])]
+                right = self._value(args[1], scope)
+                if op == 'add':
+                    result = left + right
+                elif op == 'sub':
+                    result = left - right
+                elif op == 'mul':
+                    result = left * right
+                elif op == 'div':
+                    if _to_signed(right) == 0:
+                        raise EmulatorError("division by zero")
+                    result = int(_to_signed(left) / _to_signed(right))
+                elif op == 'and':
+                    result = left & right
+                elif op == 'or':
+                    result = left | right
+                else:
+                    result = left ^ right
+                self.registers[args[0]] = result & MASK24
+            elif op in LOAD_SIZES:
+                address = self.registers[self._register(args[0])]
+                self.registers[self._register(args[1])] = self._load_memory(address, LOAD_SIZES[op])
+            elif op in STORE_SIZES:
+                address = self.registers[self._register(args[0])]
+                self._store_memory(address, self.registers[self._register(args[1])], STORE_SIZES[op])
+            elif op == 'cmp':
+                self.flags = _to_signed(self._value(args[0], scope)) - _to_signed(self._value(args[1], scope))
+            elif op in ('jmp', 'je', 'jne', 'jl', 'jg'):
+                taken = (op == 'jmp' or (op == 'je' and self.flags == 0) or (op == 'jne' and self.flags != 0)
+                         or (op == 'jl' and self.flags < 0) or (op == 'jg' and self.flags > 0))
+                if taken:
+                    pc = self._label(args[0], scope)
+            elif op == 'jsr':
+                self._push(pc)
+                pc = self._label(args[0], scope)
+            elif op == 'ret':
+                pc = self._pop()
+            elif op == 'int':
+                number = int(args[0][1:], 16)
+                if number == 0:
+                    self.exit_code = self._pop()
+                    break
+                elif number == 2:
+                    self.output.append(self._pop() & 0xFF)
+                else:
+                    raise EmulatorError(f"unsupported interrupt '{args[0]}'")
+            elif op == 'trap':
+                break
+            else:
+                raise EmulatorError(f"unknown instruction '{op}'")
+        return self.output.decode('latin-1')
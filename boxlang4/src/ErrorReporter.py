@@ -1,8 +1,24 @@
 import sys
 
+class Diagnostic:
+    def __init__(self, file: str, line: int, column: int, message: str, error_type: str, suggestion: str, text: str):
+        self.file = file
+        self.line = line
+        self.column = column
+        self.message = message
+        self.error_type = error_type
+        self.suggestion = suggestion
+        self.text = text
+
+    def to_dict(self) -> dict:
+        return {"file": self.file, "line": self.line, "column": self.column, "message": self.message,
+                "type": self.error_type, "suggestion": self.suggestion}
+
 class ErrorReporter:
-    def __init__(self):
+    def __init__(self, echo: bool = True):
+        self.echo = echo
         self._errors = []
+        self._diagnostics = []
         self._had_error = False
         self._source_lines = {} 
 
@@ -11,9 +27,11 @@ class ErrorReporter:
 
     def report(self, file: str, line: int, column: int, message: str, error_type: str = "SyntaxError", suggestion: str = None):
         full_message = self._format_error(file, line, column, message, error_type, suggestion)
-        print(full_message, file=sys.stderr)
+        if self.echo:
+            print(full_message, file=sys.stderr)
         
         self._errors.append(full_message)
+        self._diagnostics.append(Diagnostic(file, line, column, message, error_type, suggestion, full_message))
         self._had_error = True
 
     
@@ -44,7 +62,11 @@ class ErrorReporter:
     def had_error(self) -> bool:
         return self._had_error
 
+    def get_diagnostics(self) -> list:
+        return list(self._diagnostics)
+
     def clear(self):
         self._errors = []
+        self._diagnostics = []
         self._had_error = False
         self._source_lines = {}
@@ -0,0 +1,344 @@
+from src.AST import *
+from src.Token import TokenType
+from src.utils import to_twos_complement_24bit, get_load_mnemonic
+from src.RegisterAllocator import EscapeAnalyzer
+
+# Estimated (size in bytes, cycles) for each LC24 instruction form.
+# Operand kinds: 'r' - register, 'i' - immediate or label.
+LC24_COSTS = {
+    ('psh', 'r'): (2, 2), ('psh', 'i'): (4, 2),
+    ('pop', 'r'): (2, 2),
+    ('mov', 'rr'): (2, 1), ('mov', 'ri'): (5, 1),
+    ('add', 'rr'): (2, 1), ('add', 'ri'): (5, 2),
+    ('sub', 'rr'): (2, 1), ('sub', 'ri'): (5, 2),
+    ('and', 'rr'): (2, 1), ('and', 'ri'): (5, 2),
+    ('or', 'rr'): (2, 1), ('or', 'ri'): (5, 2),
+    ('xor', 'rr'): (2, 1), ('xor', 'ri'): (5, 2),
+    ('mul', 'rr'): (2, 6), ('mul', 'ri'): (5, 7),
+    ('div', 'rr'): (2, 12), ('div', 'ri'): (5, 13),
+    ('cmp', 'rr'): (2, 1), ('cmp', 'ri'): (5, 2),
+    ('lb', 'rr'): (2, 2), ('lw', 'rr'): (2, 3), ('lh', 'rr'): (2, 3),
+    ('sb', 'rr'): (2, 2), ('sw', 'rr'): (2, 3), ('sh', 'rr'): (2, 3),
+    ('jmp', 'i'): (4, 2), ('je', 'i'): (4, 2), ('jne', 'i'): (4, 2),
+    ('jl', 'i'): (4, 2), ('jg', 'i'): (4, 2),
+    ('jsr', 'i'): (4, 4), ('ret', ''): (1, 4),
+    ('int', 'i'): (2, 8),
+}
+DEFAULT_COST = (4, 2)
+
+def instruction_cost(line: str) -> tuple:
+    """Returns (size, cycles) of one line of generated assembly.
+    Labels, comments and data directives cost nothing here."""
+    text = line.split(';', 1)[0].strip()
+    if not text or text.endswith(':') or text.startswith(('bytes', 'reserve')):
+        return (0, 0)
+    parts = text.split()
+    kinds = "".join('r' if operand.startswith('%') else 'i' for operand in parts[1:])
+    return LC24_COSTS.get((parts[0], kinds), DEFAULT_COST)
+
+def sequence_cost(lines: list, metric: str = 'cycles') -> int:
+    index = 0 if metric == 'size' else 1
+    return sum(instruction_cost(line)[index] for line in lines)
+
+ALU_MNEMONICS = {
+    TokenType.PLUS: 'add',
+    TokenType.MINUS: 'sub',
+    TokenType.STAR: 'mul',
+    TokenType.SLASH: 'div',
+    TokenType.AMPERSAND: 'and',
+    TokenType.BITWISE_OR: 'or',
+    TokenType.BITWISE_XOR: 'xor',
+}
+
+COMPARISON_OPS = [TokenType.EQUAL_EQUAL, TokenType.NOT_EQUAL, TokenType.LESS_THAN,
+                  TokenType.GREATHER_THAN, TokenType.LESS_EQUAL, TokenType.GREATHER_EQUAL]
+
+COMMUTATIVE_OPS = [TokenType.PLUS, TokenType.STAR, TokenType.AMPERSAND, TokenType.BITWISE_OR,
+                   TokenType.BITWISE_XOR, TokenType.EQUAL_EQUAL, TokenType.NOT_EQUAL]
+
+# a < b  <=>  b > a
+MIRRORED_COMPARISONS = {
+    TokenType.LESS_THAN: TokenType.GREATHER_THAN,
+    TokenType.GREATHER_THAN: TokenType.LESS_THAN,
+    TokenType.LESS_EQUAL: TokenType.GREATHER_EQUAL,
+    TokenType.GREATHER_EQUAL: TokenType.LESS_EQUAL,
+}
+
+EVAL_LEFT = '<left>'
+EVAL_RIGHT = '<right>'
+EVAL_OPERAND = '<operand>'
+
+def strip_casts(node: ExpressionNode) -> ExpressionNode:
+    while isinstance(node, TypeCastNode):
+        node = node.expression
+    return node
+
+def operands_of(node: ExpressionNode) -> list:
+    children = [value for value in vars(node).values() if isinstance(value, ExpressionNode)]
+    for value in vars(node).values():
+        if isinstance(value, list):
+            children.extend(item for item in value if isinstance(item, ExpressionNode))
+    return children
+
+def literal_value(node: ExpressionNode):
+    node = strip_casts(node)
+    if isinstance(node, (NumberLiteralNode, CharLiteralNode)):
+        return int(node.value)
+    return None
+
+class Pattern:
+    """One tile: a tree shape it covers and the instructions it expands to.
+    `matcher(selector, node)` returns the template operands or None.
+    `mnemonics` limits an operand pattern to some operators. A tile that
+    `reads_after_left` loads the right variable only once the left subtree
+    has run, unlike -O0, which evaluates the right operand first."""
+    def __init__(self, name: str, matcher, template: list, mnemonics: list = None, reads_after_left: bool = False):
+        self.name = name
+        self.matcher = matcher
+        self.template = template
+        self.mnemonics = mnemonics
+        self.reads_after_left = reads_after_left
+
+class Tile:
+    def __init__(self, pattern: Pattern, lines: list, children: dict, operand: str, cost: int):
+        self.pattern = pattern
+        self.lines = lines
+        self.children = children
+        self.operand = operand
+        self.cost = cost
+
+# --- right-hand operand tiles for `op %ac <rhs>` -------------------------------
+
+def _match_any(selector, node):
+    # the template pops the right operand into %bs
+    return {'rhs': '%bs'}
+
+def _match_immediate(selector, node):
+    value = literal_value(node)
+    if value is None:
+        return None
+    return {'rhs': str(to_twos_complement_24bit(value))}
+
+def _match_register(selector, node):
+    location = selector.location_of(node)
+    if location and location[0] == 'reg':
+        return {'rhs': location[1]}
+    return None
+
+def _match_frame_slot(selector, node):
+    location = selector.location_of(node)
+    if location and location[0] == 'frame':
+        offset = location[1]
+        return {'rhs': '%bs', 'off_op': 'add' if offset > 0 else 'sub', 'off': abs(offset),
+                'load': get_load_mnemonic(strip_casts(node).var_type)}
+    return None
+
+def _match_global(selector, node):
+    location = selector.location_of(node)
+    if location and location[0] == 'global':
+        return {'rhs': '%bs', 'label': location[1], 'load': get_load_mnemonic(strip_casts(node).var_type)}
+    return None
+
+def _match_power_of_two(shift: int):
+    """LC24 has no shift instructions: x * 2^k is k doublings of %ac."""
+    def matcher(selector, node):
+        if literal_value(node) != 1 << shift:
+            return None
+        return {'rhs': str(1 << shift)}
+    return matcher
+
+OPERAND_PATTERNS = [
+    Pattern('stack', _match_any,
+            [EVAL_RIGHT, EVAL_LEFT, 'pop %ac', 'pop %bs', '{op} %ac %bs']),
+    Pattern('immediate', _match_immediate,
+            [EVAL_LEFT, 'pop %ac', '{op} %ac {rhs}']),
+    Pattern('register', _match_register,
+            [EVAL_LEFT, 'pop %ac', '{op} %ac {rhs}'], reads_after_left=True),
+    Pattern('frame_slot', _match_frame_slot,
+            [EVAL_LEFT, 'pop %ac', 'mov %bs %bp', '{off_op} %bs {off}', '{load} %bs %bs', '{op} %ac %bs'],
+            reads_after_left=True),
+    Pattern('global', _match_global,
+            [EVAL_LEFT, 'pop %ac', 'mov %bs {label}', '{load} %bs %bs', '{op} %ac %bs'], reads_after_left=True),
+] + [
+    Pattern(f'double_{shift}', _match_power_of_two(shift), [EVAL_LEFT, 'pop %ac'] + ['add %ac %ac'] * shift,
+            mnemonics=['mul'])
+    for shift in range(1, 6)
+]
+
+# --- address tiles: base + constant offset --------------------------------------
+
+def _frame_address(selector, node):
+    """Matches `&local`, `&local + k` and `&local - k` (through casts)."""
+    node = strip_casts(node)
+    delta = 0
+    if isinstance(node, BinaryOpNode) and node.op.type in (TokenType.PLUS, TokenType.MINUS):
+        value = literal_value(node.right)
+        if value is None:
+            return None
+        delta = value if node.op.type == TokenType.PLUS else -value
+        node = strip_casts(node.left)
+    if not (isinstance(node, UnaryOpNode) and node.op.type == TokenType.AMPERSAND):
+        return None
+    location = selector.location_of(node.operand)
+    if not location or location[0] != 'frame':
+        return None
+    offset = location[1] + delta
+    return {'off_op': 'add' if offset >= 0 else 'sub', 'off': abs(offset)}
+
+def _match_frame_load(selector, node):
+    operands = _frame_address(selector, node.operand)
+    if operands is None:
+        return None
+    operands['load'] = get_load_mnemonic(node.var_type)
+    return operands
+
+def _match_indirect_load(selector, node):
+    return {'load': get_load_mnemonic(node.var_type)}
+
+ADDRESS_PATTERNS = [
+    Pattern('frame_address', _frame_address,
+            ['mov %ac %bp', '{off_op} %ac {off}']),
+]
+
+LOAD_PATTERNS = [
+    Pattern('indirect', _match_indirect_load,
+            [EVAL_OPERAND, 'pop %bs', '{load} %bs %ac']),
+    Pattern('frame_offset', _match_frame_load,
+            ['mov %bs %bp', '{off_op} %bs {off}', '{load} %bs %ac']),
+]
+
+class InstructionSelector:
+    """Tiles expression trees with the patterns above and keeps the cheapest
+    cover according to LC24_COSTS. The compiler supplies variable locations.
+    Subtrees are tiled bottom-up once: the best tile and the cost of every
+    node are kept until `reset`, so emitting reuses what costing chose."""
+    def __init__(self, compiler, metric: str = 'cycles'):
+        self.compiler = compiler
+        self.metric = metric
+        # keyed by id(node); the tree outlives the function being compiled
+        self.tiles = {}
+        self.costs = {}
+        self.calls = {}
+
+    def reset(self):
+        """Forgets earlier choices; variable locations change per function."""
+        self.tiles.clear()
+        self.costs.clear()
+        self.calls.clear()
+
+    def location_of(self, node: ExpressionNode):
+        node = strip_casts(node)
+        if not isinstance(node, VarAccessNode):
+            return None
+        return self.compiler._var_location(node.var_name)
+
+    def _expand(self, pattern: Pattern, operands: dict, children: dict) -> Tile:
+        lines = [line if line in children else line.format(**operands) for line in pattern.template]
+        cost = sequence_cost([line for line in lines if line not in children], self.metric)
+        cost += sum(self.estimate(children[line]) for line in lines if line in children)
+        return Tile(pattern, lines, children, operands.get('rhs'), cost)
+
+    def _best(self, candidates: list) -> Tile:
+        return min(candidates, key=lambda tile: tile.cost)
+
+    def _has_calls(self, node: ExpressionNode) -> bool:
+        # calls are the only side effects an expression can have
+        if id(node) not in self.calls:
+            effects = EscapeAnalyzer()
+            effects.visit(node)
+            self.calls[id(node)] = effects.has_calls
+        return self.calls[id(node)]
+
+    def select_binary(self, node: BinaryOpNode, mnemonic: str):
+        """Returns (tile, op_type) for `left <op> right`. Literal left operands
+        of commutative or comparison operators are swapped to the right. When
+        the left operand calls a function, which may change the right one,
+        the right variable is read before the left is evaluated."""
+        key = (id(node), mnemonic)
+        if key not in self.tiles:
+            self.tiles[key] = self._select_binary(node, mnemonic)
+        return self.tiles[key]
+
+    def _select_binary(self, node: BinaryOpNode, mnemonic: str):
+        left, right, op_type = node.left, node.right, node.op.type
+        orientations = [(left, right, op_type)]
+        if literal_value(left) is not None:
+            if op_type in COMMUTATIVE_OPS:
+                orientations.append((right, left, op_type))
+            elif op_type in MIRRORED_COMPARISONS:
+                orientations.append((right, left, MIRRORED_COMPARISONS[op_type]))
+
+        candidates = []
+        for lhs, rhs, op in orientations:
+            left_has_calls = self._has_calls(lhs)
+            for pattern in OPERAND_PATTERNS:
+                if pattern.mnemonics and mnemonic not in pattern.mnemonics:
+                    continue
+                if pattern.reads_after_left and left_has_calls:
+                    continue
+                operands = pattern.matcher(self, rhs)
+                if operands is None:
+                    continue
+                operands = dict(operands, op=mnemonic)
+                tile = self._expand(pattern, operands, {EVAL_LEFT: lhs, EVAL_RIGHT: rhs})
+                candidates.append((tile, op))
+        return min(candidates, key=lambda candidate: candidate[0].cost)
+
+    def select_address(self, node: ExpressionNode):
+        for pattern in ADDRESS_PATTERNS:
+            operands = pattern.matcher(self, node)
+            if operands is not None:
+                return self._expand(pattern, operands, {})
+        return None
+
+    def select_load(self, node: UnaryOpNode) -> Tile:
+        candidates = []
+        for pattern in LOAD_PATTERNS:
+            operands = pattern.matcher(self, node)
+            if operands is not None:
+                candidates.append(self._expand(pattern, operands, {EVAL_OPERAND: node.operand}))
+        return self._best(candidates)
+
+    def estimate(self, node: ExpressionNode) -> int:
+        """Approximate cost of evaluating `node` onto the stack."""
+        node = strip_casts(node)
+        if id(node) not in self.costs:
+            # operands before the nodes using them, so costing never recurses deeply
+            for subtree in reversed(self._uncosted(node)):
+                if id(subtree) not in self.costs:
+                    self.costs[id(subtree)] = self._estimate(subtree)
+        return self.costs[id(node)]
+
+    def _uncosted(self, node: ExpressionNode) -> list:
+        """Subtrees of `node` without a cost yet, each before its operands."""
+        pending, found = [node], []
+        while pending:
+            current = strip_casts(pending.pop())
+            if id(current) in self.costs:
+                continue
+            found.append(current)
+            pending.extend(operands_of(current))
+        return found
+
+    def _estimate(self, node: ExpressionNode) -> int:
+        push = sequence_cost(['psh %ac'], self.metric)
+        if literal_value(node) is not None:
+            return sequence_cost(['psh 0'], self.metric)
+        if isinstance(node, VarAccessNode):
+            location = self.location_of(node)
+            if location and location[0] == 'reg':
+                return sequence_cost([f'psh {location[1]}'], self.metric)
+            return sequence_cost(['mov %bs %bp', 'add %bs 0', 'lh %bs %ac', 'psh %ac'], self.metric)
+        if isinstance(node, BinaryOpNode) and node.op.type in ALU_MNEMONICS:
+            tile, _ = self.select_binary(node, ALU_MNEMONICS[node.op.type])
+            return tile.cost + push
+        if isinstance(node, BinaryOpNode) and node.op.type in COMPARISON_OPS:
+            tile, _ = self.select_binary(node, 'cmp')
+            return tile.cost + sequence_cost(['jl l', 'psh 0', 'jmp l', 'psh 1'], self.metric)
+        if isinstance(node, UnaryOpNode) and node.op.type == TokenType.STAR:
+            return self.select_load(node).cost + push
+        children = operands_of(node)
+        own_cost = push
+        if isinstance(node, FunctionCallNode):
+            own_cost += sequence_cost(['jsr f', 'add %sp 3'], self.metric)
+        return sum(self.estimate(child) for child in children) + own_cost
@@ -0,0 +1,186 @@
+import json
+import time
+import tracemalloc
+import contextlib
+from src.AsmOptimizer import strip_comment
+
+class PhaseStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_bytes = None
+
+class CompileReport:
+    """Per-phase wall/CPU time and, with `memory`, tracemalloc peaks, plus
+    counts of what each phase produced. When neither timing nor memory is
+    requested, `phase` hands out a shared no-op context and nothing is
+    measured."""
+    def __init__(self, timing: bool = False, memory: bool = False):
+        self.timing = timing
+        self.memory = memory
+        self.phases = []
+        self.counts = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.timing or self.memory
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return NO_PHASE
+        return self._measure(name)
+
+    @contextlib.contextmanager
+    def _measure(self, name: str):
+        stats = PhaseStats(name)
+        self.phases.append(stats)
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            # memory kept from earlier phases is not this phase's
+            baseline = tracemalloc.get_traced_memory()[0]
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield stats
+        finally:
+            stats.wall = time.perf_counter() - wall
+            stats.cpu = time.process_time() - cpu
+            if self.memory:
+                stats.peak_bytes = tracemalloc.get_traced_memory()[1] - baseline
+
+    def count(self, name: str, value: int):
+        self.counts[name] = value
+
+    def finish(self):
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def to_dict(self) -> dict:
+        phases = []
+        for stats in self.phases:
+            entry = {"name": stats.name}
+            if self.timing:
+                entry["wall_seconds"] = stats.wall
+                entry["cpu_seconds"] = stats.cpu
+            if self.memory:
+                entry["peak_bytes"] = stats.peak_bytes
+            phases.append(entry)
+        return {"phases": phases, "counts": dict(self.counts)}
+
+    def format_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def format_table(self) -> str:
+        header = f"{'Phase':<18}"
+        if self.timing:
+            header += f" {'Wall (ms)':>10} {'CPU (ms)':>10} {'Wall %':>7}"
+        if self.memory:
+            header += f" {'Peak (KiB)':>11}"
+        lines = ["===== Compilation report =====", header]
+        total_wall = sum(stats.wall for stats in self.phases) or 1.0
+        for stats in self.phases:
+            line = f"{stats.name:<18}"
+            if self.timing:
+                line += f" {stats.wall * 1000:>10.2f} {stats.cpu * 1000:>10.2f} {stats.wall / total_wall * 100:>6.1f}%"
+            if self.memory:
+                line += f" {stats.peak_bytes / 1024:>11.1f}"
+            lines.append(line)
+        if self.timing:
+            lines.append(f"{'Total':<18} {sum(s.wall for s in self.phases) * 1000:>10.2f} "
+                         f"{sum(s.cpu for s in self.phases) * 1000:>10.2f}")
+        if self.memory and self.timing:
+            lines.append("(times include tracemalloc overhead)")
+        for name, value in self.counts.items():
+            lines.append(f"{name + ':':<18} {value}")
+        return "\n".join(lines)
+
+NO_PHASE = contextlib.nullcontext()
+
+def count_asm(code: str) -> tuple:
+    """Returns (instructions, labels) in generated assembly."""
+    instructions = labels = 0
+    for line in code.split('\n'):
+        text = strip_comment(line)
+        if not text:
+            continue
+        if text.split()[0].endswith(':'):
+            # also `name: bytes ...` data labels
+            labels += 1
+        elif not text.startswith(('bytes', 'reserve')):
+            instructions += 1
+    return instructions, labels
+
+def _visitor_classes(root) -> list:
+    found = [root]
+    for subclass in root.__subclasses__():
+        found.extend(_visitor_classes(subclass))
+    return found
+
+class VisitorStats:
+    """Counts calls and time per (visitor class, node class) by wrapping
+    every `visit` dispatcher while installed. Self time excludes nested
+    visits; total time counts each recursive chain of the same node kind
+    in the same pass once."""
+    def __init__(self):
+        self.calls = {}
+        self.self_time = {}
+        self.total_time = {}
+        self.originals = {}
+        # shared by every wrapped dispatcher, since passes visit through each other
+        self.stack = []
+        self.active = {}
+
+    def install(self, root):
+        for cls in _visitor_classes(root):
+            if 'visit' in cls.__dict__:
+                self.originals[cls] = cls.__dict__['visit']
+                cls.visit = self._wrap(cls.__dict__['visit'])
+
+    def uninstall(self):
+        for cls, visit in self.originals.items():
+            cls.visit = visit
+        self.originals = {}
+
+    def _wrap(self, visit):
+        stats = self
+        stack, active = self.stack, self.active
+
+        def counted_visit(visitor, node):
+            if node is None:
+                return visit(visitor, node)
+            key = (type(visitor).__name__, type(node).__name__)
+            stats.calls[key] = stats.calls.get(key, 0) + 1
+            # [start, time spent in nested visits]
+            frame = [time.perf_counter(), 0.0]
+            stack.append(frame)
+            active[key] = active.get(key, 0) + 1
+            try:
+                return visit(visitor, node)
+            finally:
+                elapsed = time.perf_counter() - frame[0]
+                stack.pop()
+                active[key] -= 1
+                stats.self_time[key] = stats.self_time.get(key, 0.0) + elapsed - frame[1]
+                if not active[key]:
+                    stats.total_time[key] = stats.total_time.get(key, 0.0) + elapsed
+                if stack:
+                    stack[-1][1] += elapsed
+        return counted_visit
+
+    def format_table(self, limit: int = 30) -> str:
+        rows = sorted(self.calls, key=lambda key: -self.self_time.get(key, 0.0))
+        lines = ["===== Visitor calls =====",
+                 f"{'Pass':<22} {'Node':<24} {'Calls':>8} {'Self (ms)':>10} {'Total (ms)':>11}"]
+        for key in rows[:limit]:
+            lines.append(f"{key[0]:<22} {key[1]:<24} {self.calls[key]:>8} "
+                         f"{self.self_time.get(key, 0.0) * 1000:>10.2f} {self.total_time.get(key, 0.0) * 1000:>11.2f}")
+        if len(rows) > limit:
+            lines.append(f"({len(rows) - limit} more)")
+        return "\n".join(lines)
+
+    def to_dict(self) -> list:
+        return [{"pass": key[0], "node": key[1], "calls": self.calls[key],
+                 "self_seconds": self.self_time.get(key, 0.0), "total_seconds": self.total_time.get(key, 0.0)}
+                for key in sorted(self.calls, key=lambda key: -self.self_time.get(key, 0.0))]
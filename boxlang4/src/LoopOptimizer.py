@@ -0,0 +1,298 @@
+from src.ASTVisitor import ASTVisitor
+from src.AST import *
+from src.Token import Token, TokenType
+from src.RegisterAllocator import EscapeAnalyzer
+from src.ValueNumbering import value_info, evaluated_expressions, Occurrence, DeclaredNames
+
+class LoopEffects(ASTVisitor):
+    """What running a loop once can change."""
+    def __init__(self):
+        self.assigned = set()
+        self.assignment_counts = {}
+        self.declared = set()
+        self.stores_memory = False
+        self.has_calls = False
+        self.has_asm = False
+
+    def visit_VarDeclarationNode(self, node: VarDeclarationNode):
+        self.declared.add(node.var_name)
+        self.assigned.add(node.var_name)
+        self.generic_visit(node)
+
+    def visit_AssignmentNode(self, node: AssignmentNode):
+        if isinstance(node.variable, VarAccessNode):
+            name = node.variable.var_name
+            self.assigned.add(name)
+            self.assignment_counts[name] = self.assignment_counts.get(name, 0) + 1
+        else:
+            self.stores_memory = True
+        self.generic_visit(node)
+
+    def visit_FunctionCallNode(self, node: FunctionCallNode):
+        self.has_calls = True
+        self.generic_visit(node)
+
+    def visit_AsmNode(self, node: AsmNode):
+        self.has_asm = True
+
+    def generic_visit(self, node):
+        for field in vars(node).values():
+            if isinstance(field, list):
+                for item in field:
+                    if isinstance(item, ASTNode):
+                        self.visit(item)
+            elif isinstance(field, ASTNode):
+                self.visit(field)
+
+def _may_fault(key) -> bool:
+    """True if evaluating the numbered expression can divide by zero."""
+    if not isinstance(key, tuple):
+        return False
+    if key[0] == 'op' and key[1] == TokenType.SLASH:
+        divisor = key[4]
+        if divisor[0] != 'lit' or divisor[1] == 0:
+            return True
+    return any(_may_fault(part) for part in key[1:])
+
+class LoopOptimizer:
+    """Loop-invariant code motion and induction-variable strength reduction
+    for `while` loops. Invariant expressions are computed once into
+    `__licm_N` locals placed right before the loop. Expressions of the
+    form `base + i*k`, where `i` only changes through one top-level
+    `i: i + c` in the body, become `__iv_N` locals that are advanced by
+    `c*k` right after that statement."""
+    INDUCTION_TYPES = ['num24']
+
+    def __init__(self):
+        self.temp_counter = 0
+        self.hoisted = []
+        self.reduced = []
+
+    def run(self, node: ProgramNode):
+        self._run_declarations(node.declarations)
+        return node
+
+    def _run_declarations(self, declarations: list):
+        for decl in declarations:
+            if isinstance(decl, FunctionDeclarationNode):
+                self.run_function(decl)
+            elif isinstance(decl, NamespaceNode):
+                self._run_declarations(decl.body)
+
+    def run_function(self, node: FunctionDeclarationNode):
+        escapes = EscapeAnalyzer()
+        declared = DeclaredNames()
+        for stmt in node.body:
+            escapes.visit(stmt)
+            declared.visit(stmt)
+        local_names = declared.names | {param.param_name for param in node.params}
+        self.exposed = lambda name: name not in local_names or name in escapes.escaped
+        self.function_name = node.name
+        self._optimize_block(node.body)
+
+    def _optimize_block(self, stmts: list):
+        result = []
+        for stmt in stmts:
+            # inner loops first, so their preheaders can move further out
+            for body in self._nested_blocks(stmt):
+                self._optimize_block(body)
+            if isinstance(stmt, WhileNode):
+                result.extend(self._optimize_loop(stmt))
+            result.append(stmt)
+        stmts[:] = result
+
+    def _nested_blocks(self, stmt) -> list:
+        if isinstance(stmt, IfNode):
+            return [stmt.then_branch] + ([stmt.else_branch] if stmt.else_branch else [])
+        if isinstance(stmt, WhileNode):
+            return [stmt.body]
+        if isinstance(stmt, SwitchNode):
+            return [case_node.body for case_node in stmt.cases] + ([stmt.default_case] if stmt.default_case else [])
+        return []
+
+    def _optimize_loop(self, loop: WhileNode) -> list:
+        effects = LoopEffects()
+        effects.visit(loop)
+        if effects.has_asm:
+            return []
+        preheader = self._reduce_induction_variables(loop, effects)
+        # the loop now also advances the new induction temporaries
+        effects = LoopEffects()
+        effects.visit(loop)
+        preheader += self._hoist_invariants(loop, effects)
+        return preheader
+
+    # --- shared helpers ------------------------------------------------------------
+
+    def _is_invariant(self, info, effects: LoopEffects) -> bool:
+        if info.variables & effects.assigned:
+            return False
+        clobbers_memory = effects.has_calls or effects.stores_memory
+        if info.reads_memory and (clobbers_memory or any(self.exposed(name) for name in effects.assigned)):
+            return False
+        if clobbers_memory and any(self.exposed(name) for name in info.variables):
+            return False
+        return True
+
+    def _loop_expressions(self, loop: WhileNode, skip: set = frozenset()) -> list:
+        """(node, holder, field, index) for every expression evaluated inside the loop."""
+        found = [(loop.condition, loop, 'condition', None)]
+        self._block_expressions(loop.body, found, skip)
+        return found
+
+    def _block_expressions(self, stmts: list, found: list, skip: set):
+        for stmt in stmts:
+            if id(stmt) in skip:
+                continue
+            if isinstance(stmt, WhileNode):
+                found.append((stmt.condition, stmt, 'condition', None))
+            for holder, field, index in evaluated_expressions(stmt):
+                node = getattr(holder, field)
+                found.append((node if index is None else node[index], holder, field, index))
+            for body in self._nested_blocks(stmt):
+                self._block_expressions(body, found, skip)
+
+    def _children(self, node) -> list:
+        if isinstance(node, BinaryOpNode):
+            return [(node.left, node, 'left', None), (node.right, node, 'right', None)]
+        if isinstance(node, UnaryOpNode):
+            return [(node.operand, node, 'operand', None)]
+        if isinstance(node, TypeCastNode):
+            return [(node.expression, node, 'expression', None)]
+        if isinstance(node, FunctionCallNode):
+            return [(arg, node, 'args', index) for index, arg in enumerate(node.args)]
+        return []
+
+    def _new_temp(self, prefix: str) -> str:
+        name = f"{prefix}{self.temp_counter}"
+        self.temp_counter += 1
+        return name
+
+    def _access(self, name: str, var_type: str, token) -> VarAccessNode:
+        return VarAccessNode(name, token=token, var_type=var_type)
+
+    # --- invariant code motion ---------------------------------------------------------
+
+    def _hoist_invariants(self, loop: WhileNode, effects: LoopEffects) -> list:
+        temps = {}
+        preheader = []
+        pending = self._loop_expressions(loop)
+        while pending:
+            node, holder, field, index = pending.pop()
+            info = value_info(node)
+            if info is not None and info.expensive and not _may_fault(info.key) and self._is_invariant(info, effects):
+                if info.key not in temps:
+                    temps[info.key] = self._new_temp("__licm_")
+                    preheader.append(VarDeclarationNode(node.var_type, temps[info.key], node))
+                    self.hoisted.append((self.function_name, temps[info.key]))
+                Occurrence(node, holder, field, index).replace(
+                    self._access(temps[info.key], node.var_type, getattr(node, 'token', None)))
+                continue
+            pending.extend(self._children(node))
+        return preheader
+
+    # --- induction variables -------------------------------------------------------------
+
+    def _induction_step(self, stmt):
+        """Returns c for a top-level `i: i + c` / `i: i - c`, else None."""
+        if not (isinstance(stmt, AssignmentNode) and isinstance(stmt.variable, VarAccessNode)):
+            return None
+        name, expr = stmt.variable.var_name, stmt.expression
+        if not isinstance(expr, BinaryOpNode) or expr.op.type not in (TokenType.PLUS, TokenType.MINUS):
+            return None
+        is_self = lambda node: isinstance(node, VarAccessNode) and node.var_name == name
+        is_literal = lambda node: isinstance(node, NumberLiteralNode)
+        if is_self(expr.left) and is_literal(expr.right):
+            step = int(expr.right.value)
+            return step if expr.op.type == TokenType.PLUS else -step
+        if expr.op.type == TokenType.PLUS and is_literal(expr.left) and is_self(expr.right):
+            return int(expr.left.value)
+        return None
+
+    def _linear(self, node, ivs: dict, effects: LoopEffects):
+        """Returns (iv, factor) if `node` is `base + iv*factor` with an invariant base."""
+        if isinstance(node, VarAccessNode) and node.var_name in ivs:
+            return (node.var_name, 1)
+        if not isinstance(node, BinaryOpNode):
+            return None
+        op = node.op.type
+        if op == TokenType.STAR:
+            for term, scale in [(node.left, node.right), (node.right, node.left)]:
+                if isinstance(scale, NumberLiteralNode):
+                    inner = self._linear(term, ivs, effects)
+                    if inner:
+                        return (inner[0], inner[1] * int(scale.value))
+            return None
+        if op not in (TokenType.PLUS, TokenType.MINUS):
+            return None
+        for term, base, sign in [(node.left, node.right, 1), (node.right, node.left, -1 if op == TokenType.MINUS else 1)]:
+            inner = self._linear(term, ivs, effects)
+            base_info = value_info(base)
+            if inner and base_info is not None and not _may_fault(base_info.key) and self._is_invariant(base_info, effects):
+                return (inner[0], inner[1] * sign)
+        return None
+
+    def _reduce_induction_variables(self, loop: WhileNode, effects: LoopEffects) -> list:
+        ivs = {}
+        for position, stmt in enumerate(loop.body):
+            step = self._induction_step(stmt)
+            name = stmt.variable.var_name if step is not None else None
+            if (step is None or effects.assignment_counts.get(name) != 1 or name in effects.declared
+                    or self.exposed(name) or stmt.variable.var_type not in self.INDUCTION_TYPES):
+                continue
+            ivs[name] = (stmt, step)
+        if not ivs:
+            return []
+
+        # maximal derived expressions, grouped by value
+        groups = {}
+        pending = self._loop_expressions(loop, skip={id(stmt) for stmt, step in ivs.values()})
+        while pending:
+            node, holder, field, index = pending.pop()
+            linear = None if isinstance(node, VarAccessNode) else self._linear(node, ivs, effects)
+            info = value_info(node)
+            if linear and info is not None and (node.var_type in self.INDUCTION_TYPES or node.var_type.endswith('*')):
+                group = groups.setdefault(info.key, {'linear': linear, 'occurrences': [], 'multiplies': False})
+                group['occurrences'].append(Occurrence(node, holder, field, index))
+                group['multiplies'] = group['multiplies'] or TokenType.STAR in [op for op in self._operators(node)]
+                continue
+            pending.extend(self._children(node))
+
+        preheader = []
+        updates = {}
+        for group in groups.values():
+            occurrences = group['occurrences']
+            # replacing a lone `p + i` trades one add for another
+            if not group['multiplies'] and len(occurrences) < 2:
+                continue
+            iv, factor = group['linear']
+            iv_stmt, step = ivs[iv]
+            first = occurrences[-1].node
+            name = self._new_temp("__iv_")
+            for occ in occurrences:
+                occ.replace(self._access(name, first.var_type, getattr(occ.node, 'token', None)))
+            preheader.append(VarDeclarationNode(first.var_type, name, first))
+
+            token = iv_stmt.expression.op
+            increment = NumberLiteralNode(str(step * factor), token=token)
+            increment.var_type = 'num24'
+            advance = BinaryOpNode(self._access(name, first.var_type, token),
+                                   Token(TokenType.PLUS, '+', token.line, token.column, token.file), increment)
+            advance.var_type = first.var_type
+            updates.setdefault(id(iv_stmt), []).append(
+                AssignmentNode(variable=self._access(name, first.var_type, token), expression=advance))
+            self.reduced.append((self.function_name, iv, name))
+
+        if updates:
+            body = []
+            for stmt in loop.body:
+                body.append(stmt)
+                body.extend(updates.get(id(stmt), []))
+            loop.body[:] = body
+        return preheader
+
+    def _operators(self, node) -> list:
+        ops = [node.op.type] if isinstance(node, (BinaryOpNode, UnaryOpNode)) else []
+        for child, *_ in self._children(node):
+            ops.extend(self._operators(child))
+        return ops
@@ -0,0 +1,227 @@
+import copy
+from src.ASTVisitor import ASTVisitor
+from src.AST import *
+from src.Token import Token, TokenType
+from src.RegisterAllocator import EscapeAnalyzer
+from src.LoopOptimizer import LoopEffects
+from src.utils import get_size_of_type
+
+CONDITIONS = {
+    TokenType.LESS_THAN: lambda a, b: a < b,
+    TokenType.LESS_EQUAL: lambda a, b: a <= b,
+    TokenType.GREATHER_THAN: lambda a, b: a > b,
+    TokenType.GREATHER_EQUAL: lambda a, b: a >= b,
+    TokenType.NOT_EQUAL: lambda a, b: a != b,
+}
+
+class NodeCounter(ASTVisitor):
+    def __init__(self):
+        self.count = 0
+
+    def generic_visit(self, node):
+        self.count += 1
+        for field in vars(node).values():
+            if isinstance(field, list):
+                for item in field:
+                    if isinstance(item, ASTNode):
+                        self.visit(item)
+            elif isinstance(field, ASTNode):
+                self.visit(field)
+
+class ConstantSubstituter(ASTVisitor):
+    """Replaces reads of one variable with a literal, in place."""
+    def __init__(self, var_name: str, value: int):
+        self.var_name = var_name
+        self.value = value
+
+    def _replace(self, node):
+        if isinstance(node, VarAccessNode) and node.var_name == self.var_name:
+            literal = NumberLiteralNode(str(self.value), token=node.token)
+            literal.var_type = node.var_type
+            return literal
+        self.visit(node)
+        return node
+
+    def generic_visit(self, node):
+        for field_name, field in vars(node).items():
+            if isinstance(node, AssignmentNode) and field_name == 'variable' and isinstance(field, VarAccessNode):
+                continue
+            if isinstance(field, list):
+                field[:] = [self._replace(item) if isinstance(item, ASTNode) else item for item in field]
+            elif isinstance(field, ASTNode):
+                setattr(node, field_name, self._replace(field))
+
+class LoopUnroller:
+    """Unrolls counting `while` loops whose trip count is known at compile time:
+
+        num24 i: 0;                    (or `i: 0;`)
+        while [i < 12] ( ...; i: i + 1; )
+
+    The bound must be a literal and `i` a local whose only update is the last
+    statement of the body. The trip count is found by running the counter as
+    the generated code does, wrapping at the width of its type. Loops whose unrolled body fits in `threshold` AST
+    nodes are replaced with straight-line copies in which `i` is a constant.
+    Larger loops get a body repeated `factor` times followed by the original
+    loop, which runs the remaining iterations."""
+    MAX_TRIPS = 4096
+    FACTORS = [8, 4, 2]
+
+    def __init__(self, threshold: int = 128):
+        self.threshold = threshold
+        self.unrolled = []
+
+    def run(self, node: ProgramNode):
+        self._run_declarations(node.declarations)
+        return node
+
+    def _run_declarations(self, declarations: list):
+        for decl in declarations:
+            if isinstance(decl, FunctionDeclarationNode):
+                escapes = EscapeAnalyzer()
+                for stmt in decl.body:
+                    escapes.visit(stmt)
+                self.escaped = escapes.escaped
+                self.function_name = decl.name
+                self._unroll_block(decl.body)
+            elif isinstance(decl, NamespaceNode):
+                self._run_declarations(decl.body)
+
+    def _unroll_block(self, stmts: list):
+        result = []
+        for stmt in stmts:
+            if isinstance(stmt, IfNode):
+                self._unroll_block(stmt.then_branch)
+                if stmt.else_branch:
+                    self._unroll_block(stmt.else_branch)
+            elif isinstance(stmt, SwitchNode):
+                for case_node in stmt.cases:
+                    self._unroll_block(case_node.body)
+                if stmt.default_case:
+                    self._unroll_block(stmt.default_case)
+            elif isinstance(stmt, WhileNode):
+                self._unroll_block(stmt.body)
+                replacement = self._unroll(stmt, result[-1] if result else None)
+                if replacement is not None:
+                    result.extend(replacement)
+                    continue
+            result.append(stmt)
+        stmts[:] = result
+
+    def _initial_value(self, stmt, var_name: str):
+        if isinstance(stmt, VarDeclarationNode) and stmt.var_name == var_name:
+            value = stmt.value
+        elif (isinstance(stmt, AssignmentNode) and isinstance(stmt.variable, VarAccessNode)
+              and stmt.variable.var_name == var_name):
+            value = stmt.expression
+        else:
+            return None
+        if isinstance(value, (NumberLiteralNode, CharLiteralNode)):
+            return int(value.value)
+        return None
+
+    @staticmethod
+    def _wrap(value: int, var_type: str) -> int:
+        """`value` as the signed integer a variable of `var_type` holds."""
+        bits = 8 * get_size_of_type(var_type)
+        value &= (1 << bits) - 1
+        return value - (1 << bits) if value >> (bits - 1) else value
+
+    def _trip_count(self, loop: WhileNode, previous):
+        """Returns (var, type, step, values, wrapped) for an unrollable loop, else
+        None. `values` holds the counter at the start of every iteration and,
+        last, after the loop; `wrapped` tells whether it overflowed on the way."""
+        condition = loop.condition
+        if not (isinstance(condition, BinaryOpNode) and condition.op.type in CONDITIONS
+                and isinstance(condition.left, VarAccessNode) and isinstance(condition.right, NumberLiteralNode)):
+            return None
+        var_name = condition.left.var_name
+        if var_name in self.escaped or condition.left.var_type != 'num24' or not loop.body:
+            return None
+
+        update = loop.body[-1]
+        if not (isinstance(update, AssignmentNode) and isinstance(update.variable, VarAccessNode)
+                and update.variable.var_name == var_name and isinstance(update.expression, BinaryOpNode)):
+            return None
+        expr = update.expression
+        if not (expr.op.type in (TokenType.PLUS, TokenType.MINUS) and isinstance(expr.left, VarAccessNode)
+                and expr.left.var_name == var_name and isinstance(expr.right, NumberLiteralNode)):
+            return None
+        step = int(expr.right.value) if expr.op.type == TokenType.PLUS else -int(expr.right.value)
+
+        effects = LoopEffects()
+        effects.visit(loop)
+        if effects.has_asm or effects.assignment_counts.get(var_name) != 1 or var_name in effects.declared:
+            return None
+
+        start = self._initial_value(previous, var_name)
+        if start is None or step == 0:
+            return None
+        var_type = condition.left.var_type
+        bound = self._wrap(int(condition.right.value), var_type)
+        test = CONDITIONS[condition.op.type]
+        values, wrapped = [self._wrap(start, var_type)], False
+        while test(values[-1], bound):
+            if len(values) > self.MAX_TRIPS:
+                return None
+            value = self._wrap(values[-1] + step, var_type)
+            wrapped = wrapped or value != values[-1] + step
+            values.append(value)
+        return var_name, var_type, step, values, wrapped
+
+    def _unroll(self, loop: WhileNode, previous):
+        found = self._trip_count(loop, previous)
+        if found is None:
+            return None
+        var_name, var_type, step, values, wrapped = found
+        trips = len(values) - 1
+
+        counter = NodeCounter()
+        for stmt in loop.body[:-1]:
+            counter.visit(stmt)
+        body_size = max(counter.count, 1)
+        token = loop.body[-1].expression.op
+
+        if trips * body_size <= self.threshold:
+            unrolled = []
+            for iteration in range(trips):
+                for stmt in loop.body[:-1]:
+                    clone = copy.deepcopy(stmt)
+                    ConstantSubstituter(var_name, values[iteration]).visit(clone)
+                    unrolled.append(clone)
+            unrolled.append(self._assign(var_name, var_type, values[-1], token))
+            self.unrolled.append((self.function_name, var_name, trips, None))
+            return unrolled
+
+        # the unrolled loop stops at a bound the counter must reach without wrapping
+        if wrapped:
+            return None
+        for factor in self.FACTORS:
+            if factor * body_size <= self.threshold and trips >= 2 * factor:
+                main_trips = trips // factor
+                main_end = values[main_trips * factor]
+                relation = TokenType.LESS_THAN if step > 0 else TokenType.GREATHER_THAN
+                condition = BinaryOpNode(copy.deepcopy(loop.condition.left),
+                                         Token(relation, '<' if step > 0 else '>', token.line, token.column, token.file),
+                                         self._literal(main_end, var_type, token))
+                condition.var_type = 'num24'
+                body = []
+                for _ in range(factor):
+                    body.extend(copy.deepcopy(stmt) for stmt in loop.body)
+                self.unrolled.append((self.function_name, var_name, trips, factor))
+                return [self._while(loop, condition, body), loop]
+        return None
+
+    def _while(self, loop: WhileNode, condition, body) -> WhileNode:
+        clone = copy.copy(loop)
+        clone.condition = condition
+        clone.body = body
+        return clone
+
+    def _literal(self, value: int, var_type: str, token) -> NumberLiteralNode:
+        literal = NumberLiteralNode(str(value), token=token)
+        literal.var_type = var_type
+        return literal
+
+    def _assign(self, var_name: str, var_type: str, value: int, token) -> AssignmentNode:
+        return AssignmentNode(variable=VarAccessNode(var_name, token=token, var_type=var_type),
+                              expression=self._literal(value, var_type, token))
@@ -4,6 +4,11 @@ from src.ASTVisitor import ASTVisitor
 from src.AST import *
 from src.Token import TokenType
 from collections import defaultdict
+from src.ValueNumbering import ValueNumbering
+from src.LoopOptimizer import LoopOptimizer
+from src.LoopUnroller import LoopUnroller
+from src.DeadCodeEliminator import DeadCodeEliminator, reads_of
+from src.RegisterAllocator import EscapeAnalyzer
 
 class UsageAnalyzer(ASTVisitor):
     def __init__(self):
@@ -21,21 +26,76 @@ class UsageAnalyzer(ASTVisitor):
             elif isinstance(field, ASTNode):
                 self.visit(field)
 
+class AssignmentCollector(ASTVisitor):
+    def __init__(self):
+        self.assigned = set()
+
+    def visit_AssignmentNode(self, node: AssignmentNode):
+        if isinstance(node.variable, VarAccessNode):
+            self.assigned.add(node.variable.var_name)
+        self.generic_visit(node)
+
+    def generic_visit(self, node):
+        for field in vars(node).values():
+            if isinstance(field, list):
+                for item in field:
+                    if isinstance(item, ASTNode):
+                        self.visit(item)
+            elif isinstance(field, ASTNode):
+                self.visit(field)
+
 class Optimizer(ASTVisitor):
-    def __init__(self, level=1):
+    def __init__(self, level=1, unroll_threshold=128, log=print):
         self.level = level
+        # receives one line per transformation
+        self.log = log
+        self.unroll_threshold = unroll_threshold
         self.constants = {}
         self.usages = defaultdict(int)
+        self.not_constant = set()
         
     def optimize(self, node: ASTNode):
-        if self.level < 3:
-            return self.visit(node)
+        if self.level >= 3:
+            unroller = LoopUnroller(self.unroll_threshold)
+            unroller.run(node)
+            for function_name, var_name, trips, factor in unroller.unrolled:
+                if factor is None:
+                    self.log(f"[O3] Loop Unrolling: Fully unrolled {trips} iterations over '{var_name}' in '{function_name}'")
+                else:
+                    self.log(f"[O3] Loop Unrolling: Unrolled {trips} iterations over '{var_name}' by {factor} in '{function_name}'")
+            
+            analyzer = UsageAnalyzer()
+            analyzer.visit(node)
+            self.usages = analyzer.usages
+            
+            # only variables that keep their initial value can be propagated
+            assignments = AssignmentCollector()
+            assignments.visit(node)
+            escapes = EscapeAnalyzer()
+            escapes.visit(node)
+            self.not_constant = assignments.assigned | escapes.escaped
         
-        analyzer = UsageAnalyzer()
-        analyzer.visit(node)
-        self.usages = analyzer.usages
+        node = self.visit(node)
         
-        return self.visit(node)
+        if self.level >= 2:
+            loops = LoopOptimizer()
+            loops.run(node)
+            for function_name, temp_name in loops.hoisted:
+                self.log(f"[O2] Loop Invariant Code Motion: Hoisted '{temp_name}' out of a loop in '{function_name}'")
+            for function_name, iv_name, temp_name in loops.reduced:
+                self.log(f"[O2] Strength Reduction: '{temp_name}' follows induction variable '{iv_name}' in '{function_name}'")
+            
+            numbering = ValueNumbering()
+            numbering.run(node)
+            for temp_name, uses in numbering.replaced:
+                self.log(f"[O2] Value Numbering: Reused '{temp_name}' in {uses} places")
+            
+            eliminator = DeadCodeEliminator()
+            eliminator.run(node)
+            for function_name, unreachable, dead_stores in eliminator.removed:
+                self.log(f"[O2] Dead Code Elimination: Removed {unreachable} unreachable statements "
+                      f"and {dead_stores} dead stores in '{function_name}'")
+        return node
 
     def analyze_usages(self, node):
         if isinstance(node, VarAccessNode):
@@ -65,8 +125,10 @@ class Optimizer(ASTVisitor):
         return node
 
     def visit_FunctionDeclarationNode(self, node: FunctionDeclarationNode):
+        global_constants = dict(self.constants)
         new_body = [self.visit(stmt) for stmt in node.body]
         node.body = [stmt for stmt in new_body if stmt is not None]
+        self.constants = global_constants
         return node
 
     def visit_AssignmentNode(self, node: AssignmentNode):
@@ -141,11 +203,11 @@ class Optimizer(ASTVisitor):
         if node.value:
             node.value = self.visit(node.value)
 
-        if self.level >= 3 and node.var_name not in self.usages:
-            print(f"[O3] Dead Code Elimination: Removed unused variable '{node.var_name}'")
+        if self.level >= 3 and node.var_name not in self.usages and not reads_of(node.value).has_calls:
+            self.log(f"[O3] Dead Code Elimination: Removed unused variable '{node.var_name}'")
             return None
 
-        if self.level >= 3 and isinstance(node.value, NumberLiteralNode):
+        if self.level >= 3 and isinstance(node.value, NumberLiteralNode) and node.var_name not in self.not_constant:
             self.constants[node.var_name] = node.value.value
 
         return node
@@ -153,6 +215,6 @@ class Optimizer(ASTVisitor):
     def visit_VarAccessNode(self, node: VarAccessNode):
         if self.level >= 3 and node.var_name in self.constants:
             const_val = self.constants[node.var_name]
-            print(f"[O3] Constant Propagation: Replaced var '{node.var_name}' with const '{const_val}'")
+            self.log(f"[O3] Constant Propagation: Replaced var '{node.var_name}' with const '{const_val}'")
             return NumberLiteralNode(const_val, token=node.token)
         return node
\ No newline at end of file
@@ -1,11 +1,29 @@
+import os
 from src.ErrorReporter import ErrorReporter
 
+# <name> includes come from the standard library next to the compiler, not the cwd
+LIB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib")
+
+def resolve_include_file(path: str, is_library: bool):
+    """Default include resolver: <name> from the standard library, "path" as
+    given. Returns (filename, lines), or None when there is no such file."""
+    filename = os.path.join(LIB_DIR, path + ".box") if is_library else path
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            return filename, f.readlines()
+    except FileNotFoundError:
+        return None
+
 class Preprocessor:
-    def __init__(self, error_reporter: ErrorReporter):
+    def __init__(self, error_reporter: ErrorReporter, includes_resolver=None, defines: dict = None):
         self.error_reporter = error_reporter
-        self.defines = {};
+        self.includes_resolver = includes_resolver or resolve_include_file
+        self.defines = dict(defines or {});
         self.out = "";
         self.skip_stack = [False]
+        # every file pulled in through $include, in the order it was read
+        self.included_files = []
+        self.included_sources = []
         
     def get_defines(self) -> dict:
         return self.defines
@@ -63,13 +81,13 @@ class Preprocessor:
                             start = directive_line.find('<') + 1
                             end = directive_line.find('>')
                             path = directive_line[start:end]
-                            include_filename = "boxlang4/lib/" + path + ".box"
+                            is_library = True
                             column += start
                         else:
                             start = directive_line.find('"') + 1
                             end = directive_line.rfind('"')
                             path = directive_line[start:end]
-                            include_filename = path
+                            is_library = False
                             column += start
 
                         if not path:
@@ -84,13 +102,9 @@ class Preprocessor:
                         )
                         continue
 
-                    try:
-                        with open(include_filename, "r", encoding="utf-8") as f:
-                            included_lines = f.readlines()
-                            self.error_reporter.load_source_file(include_filename, included_lines)
-                            self.process(included_lines, include_filename)
-                            self.out += f'$file "{original_filename}"\n'
-                    except FileNotFoundError:
+                    resolved = self.includes_resolver(path, is_library)
+                    if resolved is None:
+                        include_filename = os.path.join(LIB_DIR, path + ".box") if is_library else path
                         self.error_reporter.report(
                             original_filename,
                             line_number,
@@ -99,6 +113,13 @@ class Preprocessor:
                             "PreprocessorError",
                             "Check if the file exists and the path is correct."
                         )
+                        continue
+                    include_filename, included_lines = resolved
+                    self.error_reporter.load_source_file(include_filename, included_lines)
+                    self.included_files.append(include_filename)
+                    self.included_sources.append((include_filename, "".join(included_lines)))
+                    self.process(included_lines, include_filename)
+                    self.out += f'$file "{original_filename}"\n'
                     continue
 
                 elif directive_line.startswith("define"):
@@ -0,0 +1,114 @@
+import re
+from collections import defaultdict
+from src.ASTVisitor import ASTVisitor
+from src.AST import *
+from src.Token import TokenType
+
+ASM_PLACEHOLDER = r'\((\w+)\)'
+
+class EscapeAnalyzer(ASTVisitor):
+    """Collects variables whose storage must stay in memory: operands of `&`
+    and placeholders used inside asm[...] blocks. Also notes whether the
+    code calls other functions."""
+    def __init__(self):
+        self.escaped = set()
+        self.asm_blocks = []
+        self.has_calls = False
+
+    def visit_FunctionCallNode(self, node: FunctionCallNode):
+        self.has_calls = True
+        for arg in node.args:
+            self.visit(arg)
+
+    def visit_UnaryOpNode(self, node: UnaryOpNode):
+        if node.op.type == TokenType.AMPERSAND and isinstance(node.operand, VarAccessNode):
+            self.escaped.add(node.operand.var_name)
+        self.visit(node.operand)
+
+    def visit_AsmNode(self, node: AsmNode):
+        self.asm_blocks.append(node.code)
+        for var_name in re.findall(ASM_PLACEHOLDER, node.code):
+            self.escaped.add(var_name)
+
+    def generic_visit(self, node):
+        for field in vars(node).values():
+            if isinstance(field, list):
+                for item in field:
+                    if isinstance(item, ASTNode):
+                        self.visit(item)
+            elif isinstance(field, ASTNode):
+                self.visit(field)
+
+class UseCounter(ASTVisitor):
+    """Counts variable references, weighting the ones inside loops."""
+    LOOP_WEIGHT = 8
+
+    def __init__(self):
+        self.weights = defaultdict(int)
+        self.declared_types = defaultdict(set)
+        self.loop_depth = 0
+
+    def visit_VarAccessNode(self, node: VarAccessNode):
+        self.weights[node.var_name] += self.LOOP_WEIGHT ** self.loop_depth
+
+    def visit_VarDeclarationNode(self, node: VarDeclarationNode):
+        self.declared_types[node.var_name].add(node.var_type)
+        self.weights[node.var_name] += self.LOOP_WEIGHT ** self.loop_depth
+        if node.value is not None:
+            self.visit(node.value)
+
+    def visit_WhileNode(self, node: WhileNode):
+        self.loop_depth += 1
+        self.visit(node.condition)
+        for stmt in node.body:
+            self.visit(stmt)
+        self.loop_depth -= 1
+
+    def generic_visit(self, node):
+        for field in vars(node).values():
+            if isinstance(field, list):
+                for item in field:
+                    if isinstance(item, ASTNode):
+                        self.visit(item)
+            elif isinstance(field, ASTNode):
+                self.visit(field)
+
+class RegisterAllocator:
+    """Assigns callee-saved registers to locals and parameters that never
+    escape. Only full-width (24-bit) values are promoted, so a register holds
+    exactly what the stack slot would."""
+    CALLEE_SAVED = ['%cn', '%dc', '%dt', '%di']
+    # saving and restoring a register costs about as much as three memory accesses
+    MIN_WEIGHT = 3
+
+    def __init__(self, registers: list = None):
+        self.registers = list(registers) if registers is not None else list(self.CALLEE_SAVED)
+
+    @staticmethod
+    def is_promotable_type(var_type: str) -> bool:
+        return var_type in ['num24', 'f24'] or var_type.endswith('*')
+
+    def allocate(self, node: FunctionDeclarationNode) -> dict:
+        escapes = EscapeAnalyzer()
+        counter = UseCounter()
+        for stmt in node.body:
+            escapes.visit(stmt)
+            counter.visit(stmt)
+
+        for param in node.params:
+            counter.declared_types[param.param_name].add(param.param_type)
+
+        # hand-written asm may use any register it names
+        available = [reg for reg in self.registers
+                     if not any(reg in code for code in escapes.asm_blocks)]
+
+        candidates = []
+        for var_name, types in counter.declared_types.items():
+            if var_name in escapes.escaped or counter.weights[var_name] < self.MIN_WEIGHT:
+                continue
+            if len(types) != 1 or not self.is_promotable_type(next(iter(types))):
+                continue
+            candidates.append(var_name)
+
+        candidates.sort(key=lambda name: -counter.weights[name])
+        return dict(zip(candidates, available))
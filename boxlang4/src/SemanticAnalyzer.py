@@ -1,6 +1,7 @@
 from src.ASTVisitor import ASTVisitor
 from src.AST import *
 from src.Token import TokenType
+from src.utils import evaluate_constant, string_constant
 
 class SemanticAnalyzer(ASTVisitor):
     def __init__(self, error_reporter):
@@ -41,7 +42,7 @@ class SemanticAnalyzer(ASTVisitor):
                 token.file, token.line, token.column, message, "SemanticError"
             )
         else:
-            print(f"Semantic Error: {message}")
+            self.error_reporter.report("<unknown>", 0, 0, message, "SemanticError")
             
         raise SemanticError(message)
 
@@ -80,6 +81,10 @@ class SemanticAnalyzer(ASTVisitor):
         
         self.declare_symbol(node.var_name, {'type': node.var_type}, node)
         
+        if (node.value and self.current_function is None and evaluate_constant(node.value) is None
+                and string_constant(node.value) is None):
+            self._error(f"Initializer of global variable '{node.var_name}' must be a constant expression.", node)
+        
         if node.value:
             fake_assignment = AssignmentNode(
                 variable=VarAccessNode(node.var_name, token=node.name_token), 
@@ -0,0 +1,62 @@
+import re
+
+# one byte of a string literal as written in the source: an escape or a plain character
+STRING_UNIT = r'\\x[0-9a-fA-F]{2}|\\.|.'
+
+class StringPool:
+    """Program-wide pool of string literals. Identical literals share one
+    label, and a literal that is a suffix of a longer one is placed inside
+    it: the longer string's `bytes` directive is split and the suffix gets
+    its own label at the split point."""
+    def __init__(self, label_prefix: str = "__str_"):
+        self.label_prefix = label_prefix
+        self.labels = {}
+        self.occurrences = 0
+        self.requested_bytes = 0
+        self.emitted_bytes = 0
+
+    @staticmethod
+    def units(value: str) -> list:
+        return re.findall(STRING_UNIT, value, re.DOTALL)
+
+    def intern(self, value: str) -> str:
+        self.occurrences += 1
+        self.requested_bytes += len(self.units(value)) + 1
+        if value not in self.labels:
+            self.labels[value] = f"{self.label_prefix}{len(self.labels)}"
+        return self.labels[value]
+
+    def bytes_saved(self) -> int:
+        return self.requested_bytes - self.emitted_bytes
+
+    def emit(self) -> list:
+        """Returns the data section lines for every pooled string."""
+        values = sorted(self.labels, key=lambda value: -len(self.units(value)))
+        # host value -> {unit offset: label} of the strings placed inside it
+        hosts = {}
+        for value in values:
+            tail = self.units(value)
+            for host in hosts:
+                host_units = self.units(host)
+                if len(tail) <= len(host_units) and host_units[len(host_units) - len(tail):] == tail:
+                    hosts[host][len(host_units) - len(tail)] = self.labels[value]
+                    break
+            else:
+                hosts[value] = {0: self.labels[value]}
+
+        lines = []
+        self.emitted_bytes = 0
+        for host, labels in hosts.items():
+            host_units = self.units(host)
+            self.emitted_bytes += len(host_units) + 1
+            offsets = sorted(labels)
+            for index, offset in enumerate(offsets):
+                end = offsets[index + 1] if index + 1 < len(offsets) else len(host_units)
+                piece = "".join(host_units[offset:end])
+                if not piece:
+                    lines.append(f'{labels[offset]}: bytes 0')
+                elif end == len(host_units):
+                    lines.append(f'{labels[offset]}: bytes "{piece}" 0')
+                else:
+                    lines.append(f'{labels[offset]}: bytes "{piece}"')
+        return lines
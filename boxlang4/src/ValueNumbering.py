@@ -0,0 +1,254 @@
+from src.ASTVisitor import ASTVisitor
+from src.AST import *
+from src.Token import TokenType
+from src.RegisterAllocator import EscapeAnalyzer
+from src.InstructionSelector import ALU_MNEMONICS, COMMUTATIVE_OPS
+
+SHORT_CIRCUIT_OPS = [TokenType.LOGICAL_AND, TokenType.LOGICAL_OR]
+
+class ValueInfo:
+    """What a numbered expression reads: variables, and whether it loads memory."""
+    def __init__(self, key, size: int, variables: set, reads_memory: bool, expensive: bool):
+        self.key = key
+        self.size = size
+        self.variables = variables
+        self.reads_memory = reads_memory
+        self.expensive = expensive
+
+def value_info(node: ExpressionNode):
+    """Returns a ValueInfo whose key is equal for structurally equal pure
+    expressions, or None when the expression can have side effects."""
+    if isinstance(node, VarAccessNode):
+        return ValueInfo(('var', node.var_name), 1, {node.var_name}, False, False)
+    if isinstance(node, (NumberLiteralNode, CharLiteralNode)):
+        return ValueInfo(('lit', int(node.value)), 1, set(), False, False)
+    if isinstance(node, StringLiteralNode):
+        return ValueInfo(('str', node.value), 1, set(), False, False)
+    if isinstance(node, TypeCastNode):
+        inner = value_info(node.expression)
+        if inner is None:
+            return None
+        return ValueInfo(('cast', node.target_type, inner.key), inner.size + 1,
+                         inner.variables, inner.reads_memory, inner.expensive)
+    if isinstance(node, UnaryOpNode):
+        if node.op.type == TokenType.AMPERSAND and isinstance(node.operand, VarAccessNode):
+            # the address of a variable does not depend on its value
+            return ValueInfo(('addr', node.operand.var_name), 2, set(), False, False)
+        inner = value_info(node.operand)
+        if inner is None or node.op.type != TokenType.STAR:
+            return None
+        return ValueInfo(('load', node.var_type, inner.key), inner.size + 1, inner.variables, True, True)
+    if isinstance(node, BinaryOpNode) and node.op.type in ALU_MNEMONICS:
+        left, right = value_info(node.left), value_info(node.right)
+        if left is None or right is None:
+            return None
+        operands = [left.key, right.key]
+        if node.op.type in COMMUTATIVE_OPS:
+            operands.sort(key=repr)
+        expensive = (left.expensive or right.expensive or left.size > 1 or right.size > 1
+                     or node.op.type in [TokenType.STAR, TokenType.SLASH])
+        return ValueInfo(('op', node.op.type, node.var_type, *operands), left.size + right.size + 1,
+                         left.variables | right.variables, left.reads_memory or right.reads_memory, expensive)
+    return None
+
+def evaluated_expressions(stmt) -> list:
+    """(holder, field, index) of the expressions a statement evaluates
+    before any of its own effects take place."""
+    if isinstance(stmt, VarDeclarationNode) and stmt.value is not None:
+        return [(stmt, 'value', None)]
+    if isinstance(stmt, AssignmentNode):
+        found = [(stmt, 'expression', None)]
+        if isinstance(stmt.variable, UnaryOpNode):
+            found.append((stmt.variable, 'operand', None))
+        return found
+    if isinstance(stmt, ReturnNode) and stmt.value is not None:
+        return [(stmt, 'value', None)]
+    if isinstance(stmt, FunctionCallNode):
+        return [(stmt, 'args', index) for index in range(len(stmt.args))]
+    if isinstance(stmt, IfNode):
+        return [(stmt, 'condition', None)]
+    if isinstance(stmt, SwitchNode):
+        return [(stmt, 'expression', None)]
+    return []
+
+class Occurrence:
+    def __init__(self, node: ExpressionNode, holder, field, index):
+        self.node = node
+        self.holder = holder
+        self.field = field
+        self.index = index
+
+    def replace(self, new_node: ExpressionNode):
+        if self.index is None:
+            setattr(self.holder, self.field, new_node)
+        else:
+            getattr(self.holder, self.field)[self.index] = new_node
+
+class AvailableValue:
+    def __init__(self, info: ValueInfo, statement_index: int):
+        self.info = info
+        self.statement_index = statement_index
+        self.occurrences = []
+
+class DeclaredNames(ASTVisitor):
+    def __init__(self):
+        self.names = set()
+
+    def visit_VarDeclarationNode(self, node: VarDeclarationNode):
+        self.names.add(node.var_name)
+
+    def generic_visit(self, node):
+        for field in vars(node).values():
+            if isinstance(field, list):
+                for item in field:
+                    if isinstance(item, ASTNode):
+                        self.visit(item)
+            elif isinstance(field, ASTNode):
+                self.visit(field)
+
+class ValueNumbering:
+    """Local value numbering over the straight-line runs of each statement list.
+    A pure expression computed more than once in a run is evaluated into a
+    `__cse_N` local right before its first use, and the later copies read it.
+    Calls, stores through pointers and asm blocks end the lifetime of every
+    value that could observe them."""
+    def __init__(self):
+        self.temp_counter = 0
+        self.replaced = []
+
+    def run(self, node: ProgramNode):
+        self._run_declarations(node.declarations)
+        return node
+
+    def _run_declarations(self, declarations: list):
+        for decl in declarations:
+            if isinstance(decl, FunctionDeclarationNode):
+                self.run_function(decl)
+            elif isinstance(decl, NamespaceNode):
+                self._run_declarations(decl.body)
+
+    def run_function(self, node: FunctionDeclarationNode):
+        escapes = EscapeAnalyzer()
+        declared = DeclaredNames()
+        for stmt in node.body:
+            escapes.visit(stmt)
+            declared.visit(stmt)
+        self.locals = declared.names | {param.param_name for param in node.params}
+        # variables that a call or a store through a pointer may change
+        self.exposed = lambda name: name not in self.locals or name in escapes.escaped
+        self._number_block(node.body)
+
+    # --- blocks -----------------------------------------------------------------
+
+    def _number_block(self, stmts: list):
+        available = {}
+        finished = []
+        for index, stmt in enumerate(stmts):
+            evaluated = []
+            for holder, field, value_index in evaluated_expressions(stmt):
+                node = getattr(holder, field)
+                evaluated.append((node if value_index is None else node[value_index], holder, field, value_index))
+            in_call_statement = isinstance(stmt, FunctionCallNode) or any(self._has_call(node) for node, *_ in evaluated)
+            for node, holder, field, value_index in evaluated:
+                self._gather(node, holder, field, value_index, index, available, in_call_statement)
+
+            if isinstance(stmt, (IfNode, WhileNode, SwitchNode, AsmNode)):
+                finished.extend(available.values())
+                available = {}
+                for body in self._nested_blocks(stmt):
+                    self._number_block(body)
+                continue
+            self._kill(stmt, available, finished)
+        finished.extend(available.values())
+        self._rewrite(stmts, finished)
+
+    def _nested_blocks(self, stmt) -> list:
+        if isinstance(stmt, IfNode):
+            return [stmt.then_branch] + ([stmt.else_branch] if stmt.else_branch else [])
+        if isinstance(stmt, WhileNode):
+            return [stmt.body]
+        if isinstance(stmt, SwitchNode):
+            return [case_node.body for case_node in stmt.cases] + ([stmt.default_case] if stmt.default_case else [])
+        return []
+
+    def _has_call(self, node) -> bool:
+        escapes = EscapeAnalyzer()
+        escapes.visit(node)
+        return escapes.has_calls
+
+    def _gather(self, node, holder, field, value_index, stmt_index, available, in_call_statement):
+        """Records every numberable subexpression of `node`, innermost first."""
+        if isinstance(node, BinaryOpNode):
+            self._gather(node.left, node, 'left', None, stmt_index, available, in_call_statement)
+            if node.op.type not in SHORT_CIRCUIT_OPS:
+                self._gather(node.right, node, 'right', None, stmt_index, available, in_call_statement)
+        elif isinstance(node, (UnaryOpNode, TypeCastNode)):
+            child_field = 'operand' if isinstance(node, UnaryOpNode) else 'expression'
+            self._gather(getattr(node, child_field), node, child_field, None, stmt_index, available, in_call_statement)
+        elif isinstance(node, FunctionCallNode):
+            for index, arg in enumerate(node.args):
+                self._gather(arg, node, 'args', index, stmt_index, available, in_call_statement)
+            return
+
+        info = value_info(node)
+        if info is None or not info.expensive:
+            return
+        # the call may run between the two evaluations
+        if in_call_statement and (info.reads_memory or any(self.exposed(name) for name in info.variables)):
+            return
+        if info.key not in available:
+            available[info.key] = AvailableValue(info, stmt_index)
+        available[info.key].occurrences.append(Occurrence(node, holder, field, value_index))
+
+    def _kill(self, stmt, available: dict, finished: list):
+        def end(predicate):
+            for key in [key for key, value in available.items() if predicate(value.info)]:
+                finished.append(available.pop(key))
+
+        touches_exposed = lambda info: info.reads_memory or any(self.exposed(name) for name in info.variables)
+        if self._has_call(stmt):
+            end(touches_exposed)
+        if isinstance(stmt, VarDeclarationNode):
+            name = stmt.var_name
+            end(lambda info: name in info.variables or (self.exposed(name) and info.reads_memory))
+        elif isinstance(stmt, AssignmentNode) and isinstance(stmt.variable, VarAccessNode):
+            name = stmt.variable.var_name
+            end(lambda info: name in info.variables or (self.exposed(name) and info.reads_memory))
+        elif isinstance(stmt, AssignmentNode):
+            end(touches_exposed)
+
+    # --- rewriting ----------------------------------------------------------------
+
+    def _rewrite(self, stmts: list, values: list):
+        inserts = {}
+        consumed = set()
+        for value in sorted(values, key=lambda value: -value.info.size):
+            occurrences = [occ for occ in value.occurrences if id(occ.node) not in consumed]
+            if len(occurrences) < 2:
+                continue
+            for occ in occurrences:
+                self._consume(occ.node, consumed)
+
+            first = occurrences[0].node
+            name = f"__cse_{self.temp_counter}"
+            self.temp_counter += 1
+            for occ in occurrences:
+                access = VarAccessNode(name, token=getattr(occ.node, 'token', None))
+                access.var_type = first.var_type
+                occ.replace(access)
+            decl = VarDeclarationNode(first.var_type, name, first)
+            inserts.setdefault(value.statement_index, []).append(decl)
+            self.replaced.append((name, len(occurrences)))
+
+        for index in sorted(inserts, reverse=True):
+            stmts[index:index] = inserts[index]
+
+    def _consume(self, node, consumed: set):
+        consumed.add(id(node))
+        for field in vars(node).values():
+            if isinstance(field, ASTNode):
+                self._consume(field, consumed)
+            elif isinstance(field, list):
+                for item in field:
+                    if isinstance(item, ASTNode):
+                        self._consume(item, consumed)
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+from src.BatchCompiler import CachingIncludeResolver, compile_unit
+
+def _mtime(path: str):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+class Watcher:
+    """Rebuilds (source, output) units whenever a file they read changes.
+    Each unit depends on its source and on every file its last build
+    included; changed files are found by polling modification times.
+    `depfiles` maps a source to the depfile its builds rewrite."""
+    def __init__(self, units: list, options: dict, cache_settings=None, interval: float = 0.25, log=print,
+                 depfiles: dict = None):
+        self.units = units
+        self.options = options
+        self.cache_settings = cache_settings
+        self.interval = interval
+        self.log = log
+        self.depfiles = depfiles or {}
+        self.dependencies = {}
+        self.mtimes = {}
+        # one resolver for the whole session, so unchanged includes are not reread
+        self.resolver = CachingIncludeResolver()
+
+    def build(self, units: list):
+        for source, output in units:
+            result = compile_unit(source, output, self.options, self.cache_settings, self.resolver,
+                                  self.depfiles.get(source))
+            # keep the files of the last good build as well, so fixing an
+            # include that a broken build never reached still triggers a rebuild
+            previous = self.dependencies.get(source, [])
+            self.dependencies[source] = list(dict.fromkeys(result.dependencies + (previous if not result.success else [])))
+            for path in self.dependencies[source]:
+                self.mtimes.setdefault(path, _mtime(path))
+            if result.success:
+                status = "cached" if result.cached else "ok"
+                self.log(f"[watch] {status:<6} {source} -> {output} ({result.seconds * 1000:.1f} ms)")
+            else:
+                sys.stderr.write(result.error_text)
+                self.log(f"[watch] FAILED {source} ({result.failed_stage})")
+
+    def changed_files(self) -> list:
+        changed = []
+        for path, mtime in self.mtimes.items():
+            current = _mtime(path)
+            if current != mtime:
+                self.mtimes[path] = current
+                changed.append(path)
+        return changed
+
+    def affected_units(self, changed: list) -> list:
+        changed = {os.path.abspath(path) for path in changed}
+        return [(source, output) for source, output in self.units
+                if any(os.path.abspath(path) in changed for path in self.dependencies.get(source, [source]))]
+
+    def run(self):
+        self.build(self.units)
+        self.log(f"[watch] watching {len(self.mtimes)} files, press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(self.interval)
+                changed = self.changed_files()
+                if not changed:
+                    continue
+                units = self.affected_units(changed)
+                start = time.perf_counter()
+                self.build(units)
+                self.log(f"[watch] {', '.join(changed)} changed: rebuilt {len(units)} of {len(self.units)} "
+                         f"units in {(time.perf_counter() - start) * 1000:.1f} ms")
+        except KeyboardInterrupt:
+            self.log("[watch] stopped.")
@@ -1,4 +1,7 @@
 from src.Token import TokenType
+from src.AST import *
+
+COMPILER_VERSION = "4.1.0"
 
 def get_type_by_token_type(type: TokenType) -> str:
     if (type == TokenType.NUM16):
@@ -23,7 +26,42 @@ def get_size_of_type(type_name: str) -> int:
             return 1
         return 0
     
+def get_load_mnemonic(type_name: str) -> str:
+    if type_name in ['num16', 'f16']:
+        return 'lw'
+    if type_name == 'char':
+        return 'lb'
+    return 'lh'
+
 def to_twos_complement_24bit(value: int) -> int:
     if value < 0:
         value = (1 << 24) + value
-    return value
\ No newline at end of file
+    return value
+
+def evaluate_constant(node: ExpressionNode):
+    """Folds a literal expression to an int, or returns None if it is not constant."""
+    if isinstance(node, (NumberLiteralNode, CharLiteralNode)):
+        return int(node.value)
+    if isinstance(node, TypeCastNode):
+        return evaluate_constant(node.expression)
+    if isinstance(node, BinaryOpNode):
+        left = evaluate_constant(node.left)
+        right = evaluate_constant(node.right)
+        if left is None or right is None:
+            return None
+        op = node.op.type
+        if op == TokenType.PLUS: return left + right
+        if op == TokenType.MINUS: return left - right
+        if op == TokenType.STAR: return left * right
+        if op == TokenType.SLASH and right != 0: return int(left / right)
+        if op == TokenType.AMPERSAND: return left & right
+        if op == TokenType.BITWISE_OR: return left | right
+        if op == TokenType.BITWISE_XOR: return left ^ right
+    return None
+
+def string_constant(node: ExpressionNode):
+    """The string literal a (possibly cast) expression is, or None. Its
+    address is fixed at link time, so it can initialize a global."""
+    while isinstance(node, TypeCastNode):
+        node = node.expression
+    return node if isinstance(node, StringLiteralNode) else None
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the compiler is imported as `src.*`, from the directory main.py lives in
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
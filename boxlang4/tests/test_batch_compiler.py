@@ -0,0 +1,86 @@
+import os
+import pytest
+from src.BatchCompiler import compile_batch
+from src.Depfile import format_depfile
+from src.Preprocessor import LIB_DIR
+
+SHARED = '''$include <cli>
+
+box twice[num24 v] -> num24 ( ret v * 2; )
+'''
+
+UNIT = '''$include "my src/shared.box"
+
+box _start[] -> void (
+    open cli::putc[(char)(open twice[{value}] + 48)];
+    asm["psh 0"];
+    asm["int $0"];
+)
+'''
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    # quoted includes are relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("my src")
+    with open("my src/shared.box", "w", encoding="utf-8") as f:
+        f.write(SHARED)
+    paths = []
+    for name, value in [("first", 1), ("second", 3)]:
+        path = f"my src/{name}.box"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(UNIT.format(value=value))
+        paths.append(path)
+    return paths
+
+def _outputs(directory: str) -> dict:
+    found = {}
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+            found[name] = f.read()
+    return found
+
+def test_depfiles_list_target_source_and_includes(sources):
+    results = compile_batch(sources, "out dir", 1, {"opt_level": 2}, depfiles=True)
+    assert all(result.success for result in results)
+    for source in sources:
+        stem = os.path.splitext(os.path.basename(source))[0]
+        with open(f"out dir/{stem}.d", "r", encoding="utf-8") as f:
+            depfile = f.read()
+        cli = os.path.join(LIB_DIR, "cli.box").replace(" ", "\\ ")
+        assert depfile == (f"out\\ dir/{stem}.asm: \\\n"
+                           f"  my\\ src/{stem}.box \\\n"
+                           f"  my\\ src/shared.box \\\n"
+                           f"  {cli}\n")
+
+def test_parallel_batch_matches_serial(sources):
+    serial = compile_batch(sources, "serial", 1, {"opt_level": 3}, depfiles=True)
+    parallel = compile_batch(sources, "parallel", 2, {"opt_level": 3}, depfiles=True)
+    assert [result.success for result in serial + parallel] == [True] * 4
+    assert [result.source for result in parallel] == sources
+    serial_files, parallel_files = _outputs("serial"), _outputs("parallel")
+    assert sorted(serial_files) == ["first.asm", "first.d", "second.asm", "second.d"]
+    for name, text in serial_files.items():
+        assert parallel_files[name] == text.replace("serial/", "parallel/")
+
+def test_failed_unit_does_not_stop_the_batch(sources):
+    with open("my src/broken.box", "w", encoding="utf-8") as f:
+        f.write("box _start[] -> void (\n    num24 x: missing;\n)\n")
+    results = compile_batch(sources + ["my src/broken.box"], "out", 2, {}, depfiles=True)
+    assert [result.success for result in results] == [True, True, False]
+    assert results[2].failed_stage == "semantic" and "missing" in results[2].error_text
+    assert not os.path.exists("out/broken.asm") and not os.path.exists("out/broken.d")
+
+def test_depfile_escapes_make_specials():
+    assert format_depfile("a b.asm", ["c$d.box", "e#f.box", "c$d.box"]) == \
+        "a\\ b.asm: \\\n  c$$d.box \\\n  e\\#f.box\n"
+
+def test_command_line_depfile_flags(sources):
+    from main import compile_lc24
+    compile_lc24(["my src/first.box", "-o", "first out.asm", "-MF", "first.dep", "--no-cache"])
+    with open("first.dep", "r", encoding="utf-8") as f:
+        assert f.read().startswith("first\\ out.asm: \\\n  my\\ src/first.box \\\n  my\\ src/shared.box \\\n")
+    compile_lc24(["my src/first.box", "-o", "first out.asm", "-MD", "--no-cache"])
+    assert os.path.exists("first out.d")
+    compile_lc24(sources + ["--outdir", "batch", "-MD", "-j", "2", "--no-cache"])
+    assert sorted(os.listdir("batch")) == ["first.asm", "first.d", "second.asm", "second.d"]
@@ -0,0 +1,80 @@
+import os
+import pytest
+from src.CompilerDriver import compile_source
+from src.CompileCache import CompileCache
+
+SOURCE = '''$include "values.box"
+
+box _start[] -> void (
+    num24 x: VALUE;
+    asm["psh 0"];
+    asm["int $0"];
+)
+'''
+
+INCLUDE = "num24 g_value: 7;\n"
+
+def _build(cache, include=INCLUDE, **options):
+    def resolve(path, is_library):
+        return (path, include.splitlines(keepends=True)) if path == "values.box" else None
+    result = compile_source(SOURCE, "main.box", resolve, cache=cache, **dict({"defines": {"VALUE": "1"}}, **options))
+    assert result.success
+    return result
+
+@pytest.fixture
+def cache(tmp_path):
+    return CompileCache(str(tmp_path), 1024 * 1024)
+
+def test_unchanged_build_hits(cache):
+    first = _build(cache)
+    second = _build(cache)
+    assert not first.cached and second.cached
+    assert second.assembly == first.assembly
+
+@pytest.mark.parametrize("change", [
+    {"include": "num24 g_value: 8;\n"},
+    {"defines": {"VALUE": "2"}},
+    {"opt_level": 1},
+    {"opt_level": 2},
+    {"optimize_size": True},
+    {"abi": "stack", "opt_level": 2},
+    {"unroll_threshold": 16},
+])
+def test_changed_input_misses(cache, change):
+    if "abi" in change:
+        _build(cache, opt_level=2, abi="fast")
+    else:
+        _build(cache)
+    assert not _build(cache, **change).cached
+
+def _entries(cache) -> list:
+    return [os.path.join(cache.directory, name) for name in os.listdir(cache.directory) if name.endswith(cache.SUFFIX)]
+
+@pytest.mark.parametrize("damage", ["truncate", "corrupt", "garbage"])
+def test_damaged_entry_is_ignored(cache, damage):
+    expected = _build(cache).assembly
+    [path] = _entries(cache)
+    with open(path, "rb") as f:
+        data = f.read()
+    if damage == "truncate":
+        data = data[:len(data) // 2]
+    elif damage == "corrupt":
+        data = data.replace(b"psh", b"pop", 1)
+    else:
+        data = b"\xff\xfe not an entry"
+    with open(path, "wb") as f:
+        f.write(data)
+    rebuilt = _build(cache)
+    assert not rebuilt.cached
+    assert rebuilt.assembly == expected
+    assert _build(cache).cached
+
+def test_partial_write_is_never_read(cache):
+    expected = _build(cache).assembly
+    [path] = _entries(cache)
+    os.remove(path)
+    # what an interrupted put leaves behind
+    with open(f"{path}.1234.tmp", "w", encoding="utf-8") as f:
+        f.write(expected[:10])
+    rebuilt = _build(cache)
+    assert not rebuilt.cached and rebuilt.assembly == expected
@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import socket
+import shutil
+import subprocess
+import pytest
+from test_programs import TESTS_DIR, compile_program
+
+BOXLANG_DIR = os.path.dirname(TESTS_DIR)
+PROGRAMS = ["calls.box", "comparisons.box", "common.box"]
+
+def _listening(socket_path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+@pytest.fixture
+def server(tmp_path):
+    for name in PROGRAMS:
+        shutil.copy(os.path.join(TESTS_DIR, "programs", name), tmp_path)
+    socket_path = str(tmp_path / "boxc.sock")
+    env = dict(os.environ, BOXC_SOCKET=socket_path, BOXC_CACHE_DIR=str(tmp_path / "cache"))
+    process = subprocess.Popen([sys.executable, os.path.join(BOXLANG_DIR, "main.py"), "--server", "--workers", "2"],
+                               env=env, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while not (_listening(socket_path)):
+        assert process.poll() is None and time.monotonic() < deadline, "the server did not start"
+        time.sleep(0.05)
+    yield tmp_path, env
+    _client(tmp_path, env, "--stop-server")
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def _client(cwd, env, *argv):
+    return subprocess.run([sys.executable, os.path.join(BOXLANG_DIR, "client.py"), *argv],
+                          cwd=cwd, env=env, capture_output=True, text=True, timeout=30)
+
+def _read(path) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def test_compile_matches_in_process(server):
+    directory, env = server
+    completed = _client(directory, env, "calls.box", "-O", "2", "-o", "calls.asm", "--no-cache")
+    assert completed.returncode == 0, completed.stderr
+    assert _read(directory / "calls.asm") == compile_program(str(directory / "calls.box"), opt_level=2).assembly
+
+def test_batch_matches_in_process(server):
+    directory, env = server
+    completed = _client(directory, env, "calls.box", "comparisons.box", "--outdir", "out", "-O", "3", "-j", "2",
+                        "--no-cache")
+    assert completed.returncode == 0, completed.stderr
+    for name in ["calls", "comparisons"]:
+        expected = compile_program(str(directory / f"{name}.box"), opt_level=3).assembly
+        assert _read(directory / "out" / f"{name}.asm") == expected
+
+@pytest.mark.parametrize("option", ["--server=/tmp/other.sock", "--server", "--watch", "--wat"])
+def test_rejects_options_that_would_not_return(server, option):
+    directory, env = server
+    completed = _client(directory, env, "calls.box", option)
+    assert completed.returncode == 1
+    assert "cannot be sent to a server" in completed.stderr
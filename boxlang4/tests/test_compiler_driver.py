@@ -0,0 +1,81 @@
+import os
+import threading
+from src.CompilerDriver import compile_source
+from src.Emulator import Emulator
+from src.Preprocessor import resolve_include_file
+from test_programs import TESTS_DIR
+
+SOURCE = '''$include "common.box"
+
+box sum_to[num24 n] -> num24 (
+    num24 i: 0;
+    num24 s: 0;
+    while [i < 10] (
+        s: s + i * n;
+        i: i + 1;
+    )
+    ret s;
+)
+
+box _start[] -> void (
+$ifdef DOUBLE
+    open println_num[VALUE * 2];
+$else
+    open println_num[VALUE];
+$endif
+    open println_num[open sum_to[1]];
+    asm["psh 0"];
+    asm["int $0"];
+)
+'''
+
+def _resolve(path, is_library):
+    return resolve_include_file(path if is_library else os.path.join(TESTS_DIR, "programs", path), is_library)
+
+def _compile(**options):
+    return compile_source(SOURCE, "driver.box", _resolve, **options)
+
+def test_calls_do_not_leak_into_each_other():
+    doubled = _compile(defines={"DOUBLE": "1", "VALUE": "21"}, opt_level=3)
+    plain = _compile(defines={"VALUE": "5"}, opt_level=0)
+    assert doubled.success and plain.success
+    assert "DOUBLE" in doubled.defines and "DOUBLE" not in plain.defines
+    assert doubled.defines["VALUE"] == "21" and plain.defines["VALUE"] == "5"
+    assert Emulator(doubled.assembly).run() == "42\n45\n"
+    assert Emulator(plain.assembly).run() == "5\n45\n"
+    # -O0 reports nothing; the -O3 reports stay with the -O3 result
+    assert doubled.messages and not plain.messages
+    assert plain.assembly == _compile(defines={"VALUE": "5"}, opt_level=0).assembly
+    assert doubled.assembly == _compile(defines={"DOUBLE": "1", "VALUE": "21"}, opt_level=3).assembly
+
+def test_concurrent_calls_match_sequential_ones():
+    configurations = [({"VALUE": str(value)}, level) for value in range(4) for level in range(4)]
+    expected = [_compile(defines=defines, opt_level=level).assembly for defines, level in configurations]
+    results = [None] * len(configurations)
+
+    def build(index):
+        defines, level = configurations[index]
+        results[index] = _compile(defines=defines, opt_level=level).assembly
+
+    threads = [threading.Thread(target=build, args=(index,)) for index in range(len(configurations))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == expected
+
+def test_semantic_error_is_returned_not_printed(capsys):
+    result = compile_source("box _start[] -> void (\n    num24 x: missing;\n)\n", "broken.box", echo=False)
+    assert not result.success
+    assert result.failed_stage == "semantic"
+    assert result.assembly is None
+    [diagnostic] = result.diagnostics
+    assert diagnostic.error_type == "SemanticError"
+    assert diagnostic.file == "broken.box" and "missing" in diagnostic.message
+    assert "missing" in diagnostic.text
+    captured = capsys.readouterr()
+    assert captured.out == "" and captured.err == ""
+
+def test_echo_prints_the_same_diagnostics(capsys):
+    result = compile_source("box _start[] -> void (\n    num24 x: missing;\n)\n", "broken.box", echo=True)
+    assert result.diagnostics[0].text in capsys.readouterr().err
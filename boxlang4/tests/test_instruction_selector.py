@@ -0,0 +1,19 @@
+import time
+import pytest
+from src.CompilerDriver import compile_source
+
+def _deep_sum(terms: int) -> str:
+    return ("box f[num24 a] -> num24 (\n    ret " + " + ".join(["a"] * terms) + ";\n)\n"
+            "box _start[] -> void (\n    open f[1];\n)\n")
+
+@pytest.mark.parametrize("opt_level", [1, 2, 3])
+def test_deep_expression_compiles_in_linear_time(opt_level):
+    # every candidate tile used to re-cost its whole subtree: 16 terms took seconds
+    start = time.perf_counter()
+    result = compile_source(_deep_sum(40), "deep.box", opt_level=opt_level)
+    assert result.success
+    assert time.perf_counter() - start < 2.0
+
+def test_deep_expression_does_not_exhaust_the_stack():
+    result = compile_source(_deep_sum(200), "deep.box", opt_level=1)
+    assert result.success
@@ -0,0 +1,94 @@
+"""Differential tests: every program is compiled at each optimization level,
+run in the emulator, and must print what its .out file says, or what it
+prints at -O0 when it has none. The bench programs are included, and the
+optimizations they are meant to exercise are checked to actually fire."""
+import os
+import glob
+import functools
+import pytest
+from src.CompilerDriver import compile_source
+from src.Emulator import Emulator
+from src.Preprocessor import resolve_include_file
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join(os.path.dirname(TESTS_DIR), "bench", "programs")
+PROGRAM_DIRS = [os.path.join(TESTS_DIR, "programs"), BENCH_DIR]
+
+LEVELS = {
+    "O0": {"opt_level": 0},
+    "O1": {"opt_level": 1},
+    "O2": {"opt_level": 2},
+    "O3": {"opt_level": 3},
+    "Os": {"optimize_size": True},
+    "O2-stack-abi": {"opt_level": 2, "abi": "stack"},
+    "O3-stack-abi": {"opt_level": 3, "abi": "stack"},
+}
+
+def _programs() -> list:
+    paths = []
+    for directory in PROGRAM_DIRS:
+        paths += [path for path in sorted(glob.glob(os.path.join(directory, "*.box")))
+                  if os.path.basename(path) != "common.box"]
+    return paths
+
+def _resolver(directory: str):
+    """Quoted includes are looked up next to the program, not in the cwd."""
+    def resolve(path: str, is_library: bool):
+        return resolve_include_file(path if is_library else os.path.join(directory, path), is_library)
+    return resolve
+
+def compile_program(path: str, **options):
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    result = compile_source(text, path, _resolver(os.path.dirname(path)), **options)
+    assert result.success, "".join(diagnostic.text for diagnostic in result.diagnostics) or result.error
+    return result
+
+@functools.lru_cache(maxsize=None)
+def run_program(path: str, **options) -> str:
+    return Emulator(compile_program(path, **options).assembly).run()
+
+def expected_output(path: str) -> str:
+    expected_path = os.path.splitext(path)[0] + ".out"
+    if os.path.exists(expected_path):
+        with open(expected_path, "r", encoding="utf-8") as f:
+            return f.read()
+    return run_program(path, **LEVELS["O0"])
+
+@pytest.mark.parametrize("level", LEVELS)
+@pytest.mark.parametrize("path", _programs(), ids=os.path.basename)
+def test_program_output(path, level):
+    assert run_program(path, **LEVELS[level]) == expected_output(path)
+
+def _program(name: str) -> str:
+    for directory in PROGRAM_DIRS:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(name)
+
+def _reported(result, pass_name: str) -> bool:
+    return any(pass_name in message for message in result.messages)
+
+# (program, level, what shows the optimization was applied)
+APPLIED_OPTIMIZATIONS = {
+    "tail calls": ("rec.box", "O2", lambda result: "jmp .body" in result.assembly),
+    "tail calls with calls in arguments": ("calls.box", "O2", lambda result: "jmp .body" in result.assembly),
+    "loop unrolling": ("unroll.box", "O3", lambda result: _reported(result, "Loop Unrolling")),
+    "identical code folding": ("icf.box", "O2", lambda result: _reported(result, "Identical Code Folding")),
+    "machine outlining": ("cse.box", "Os", lambda result: "__outline_" in result.assembly),
+    "string pooling under -Os": ("globals.box", "Os", lambda result: _reported(result, "[Os] String Pooling")),
+}
+
+@pytest.mark.parametrize("optimization", APPLIED_OPTIMIZATIONS)
+def test_optimization_is_applied(optimization):
+    name, level, applied = APPLIED_OPTIMIZATIONS[optimization]
+    assert applied(compile_program(_program(name), **LEVELS[level]))
+
+@pytest.mark.parametrize("name", ["calls.box", "rec.box"])
+def test_fast_abi_passes_arguments_in_registers(name):
+    path = _program(name)
+    fast = compile_program(path, opt_level=2, abi="fast").assembly
+    stack = compile_program(path, opt_level=2, abi="stack").assembly
+    assert fast != stack
+    assert run_program(path, opt_level=2, abi="fast") == run_program(path, opt_level=2, abi="stack")